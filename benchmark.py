@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# benchmark.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+import argparse
+import datetime
+import json
+import platform
+import resource
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+import imeffect.basic as basic
+import imeffect.preset as preset
+from imeffect.arena import Arena, using
+from imeffect.compiler import reads_origin
+
+#: Image sizes, as (*height*, *width*) tuples.
+SIZES = {
+    '512': (512, 512),
+    '2k': (1080, 2048),
+    '4k': (2160, 3840),
+    '24mp': (4000, 6000),
+}
+
+#: Arguments of the basic filters.
+BASIC_ARGS = {
+    'FillColor': (((0xf4, 0x96, 0x00),), {}),
+    'Brightness': ((10,), {}),
+    'Saturation': ((-20,), {}),
+    'Vibrance': ((40,), {}),
+    'Greyscale': ((), {}),
+    'Contrast': ((10,), {}),
+    'Hue': ((30,), {}),
+    'Colorize': (((0xea, 0x1c, 0x5d), 20), {}),
+    'Invert': ((), {}),
+    'Sepia': ((50,), {}),
+    'Gamma': ((1.4,), {}),
+    'Noise': ((20,), {}),
+    'Clip': ((10,), {}),
+    'Channels': ((), {'red': 10, 'blue': -5}),
+    'Curves': (((0, 1, 2), ((0, 10), (120, 90), (180, 200), (235, 255))),
+               {}),
+    'Exposure': ((10,), {}),
+    'Posterize': ((50,), {}),
+    'Vignette': ((50, 30), {}),
+    'Sharpen': ((20,), {}),
+    'GaussianBlur': ((5,), {}),
+}
+
+# ru_maxrss is measured in kilobytes on Linux
+_KB = 1024
+
+
+def create_filter(name, compiled=False):
+    """Creates the basic filter or preset of the given name.
+
+    :param compiled: whether to compile presets (see
+                     :meth:`LayeredFilter.compile
+                     <imeffect.base.LayeredFilter.compile>`).
+    """
+
+    if name in BASIC_ARGS:
+        args, kwargs = BASIC_ARGS[name]
+        return getattr(basic, name)(*args, **kwargs)
+
+    f = getattr(preset, name)()
+    return f.compile() if compiled else f
+
+
+def create_image(shape, dtype):
+    """Creates a random image row by row, so that no full-size temporaries
+    raise the peak memory before the measurement.
+    """
+
+    rng = np.random.RandomState(0)
+    img = np.empty(shape, dtype=dtype)
+    for row in img:
+        values = rng.rand(*row.shape)
+        if img.dtype.kind == 'u':
+            values *= np.iinfo(img.dtype).max
+            np.rint(values, out=values)
+
+        row[...] = values
+
+    return img
+
+
+def _time_layers(f, img):
+    """Applies the layers of the given layered filter to the image one by one
+    like :meth:`LayeredFilter._apply_layers
+    <imeffect.base.LayeredFilter._apply_layers>`, and returns the time spent
+    in each of them.
+    """
+
+    times = []
+    with using(Arena()):
+        snapshot = any(reads_origin(l) for l in f._layers)
+        origin_img = img.copy() if snapshot else img
+        for l in f._layers:
+            start = time.time()
+            l(img, origin_img)
+            times.append(time.time() - start)
+
+    return times
+
+
+def _layer_name(layer):
+    f = getattr(layer, 'filter', layer)
+    return type(f).__name__
+
+
+def run_case(case):
+    """Runs one benchmark case and returns its results as a dict.
+
+    Each case runs in a fresh worker process, so that peak memory and page
+    faults are not affected by other cases. Peak memory is the growth of the
+    peak resident set size during the runs. The number of minor page faults
+    per run stands for the number of fresh allocations, since each large
+    array is backed by newly mapped pages.
+    """
+
+    name, size, dtype, repeat, compiled = case
+    shape = SIZES[size] + (3,)
+    f = create_filter(name, compiled)
+
+    src = create_image(shape, dtype)
+    img = np.empty_like(src)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    base_rss = usage.ru_maxrss
+    base_faults = usage.ru_minflt
+
+    times = []
+    for _ in xrange(repeat):
+        img[...] = src
+        start = time.time()
+        f(img)
+        times.append(time.time() - start)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    best = min(times)
+    result = {
+        'filter': name,
+        'kind': 'basic' if name in BASIC_ARGS else 'preset',
+        'compiled': compiled,
+        'size': size,
+        'shape': list(shape),
+        'dtype': np.dtype(dtype).name,
+        'times': times,
+        'best': best,
+        'median': float(np.median(times)),
+        'megapixels_per_second': shape[0] * shape[1] / best / 1e6,
+        'peak_memory_bytes': (usage.ru_maxrss - base_rss) * _KB,
+        'page_faults': (usage.ru_minflt - base_faults) // repeat,
+    }
+
+    # per-layer timings are taken in separate runs after the measurement, so
+    # that the timed runs follow the same path as production ones; they are
+    # only meaningful for floating-point images, since integer ones are
+    # mapped through baked lookup tables
+    layers = getattr(f, '_layers', None)
+    if layers is not None and img.dtype.kind == 'f':
+        timings = np.zeros(len(layers))
+        for _ in xrange(repeat):
+            img[...] = src
+            timings += _time_layers(f, img)
+
+        result['layers'] = [{'name': _layer_name(l), 'time': t / repeat}
+                            for l, t in zip(layers, timings)]
+
+    return result
+
+
+def compare(results, baseline, budget):
+    """Compares best times with a baseline and returns the cases slower than
+    the given ratio. Cases are matched by filter, compilation, size and type.
+    """
+
+    def key(r):
+        return (r['filter'], r.get('compiled', False), r['size'], r['dtype'])
+
+    previous = dict((key(r), r) for r in baseline['results'])
+    regressions = []
+    for r in results:
+        old = previous.get(key(r))
+        if old is not None and r['best'] > old['best'] * budget:
+            regressions.append((r, r['best'] / old['best']))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks basic filters and presets of imeffect.')
+    parser.add_argument('--filters', nargs='+',
+                        default=list(basic.__all__) + list(preset.__all__),
+                        help='names of basic filters and presets')
+    parser.add_argument('--sizes', nargs='+', default=['512', '2k'],
+                        choices=sorted(SIZES), help='image sizes')
+    parser.add_argument('--dtypes', nargs='+',
+                        default=['float64', 'float32', 'uint8'],
+                        help='image types')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs of each case')
+    parser.add_argument('--compile', action='store_true',
+                        help='compile presets before running them')
+    parser.add_argument('--output', default='benchmark.json',
+                        help='path of the JSON results')
+    parser.add_argument('--baseline',
+                        help='path of previous JSON results to compare with')
+    parser.add_argument('--budget', type=float, default=1.1,
+                        help='largest allowed ratio to the baseline times')
+    args = parser.parse_args()
+
+    cases = [(name, size, dtype, args.repeat, args.compile)
+             for size in args.sizes
+             for dtype in args.dtypes
+             for name in args.filters]
+
+    results = []
+    pool = Pool(1, maxtasksperchild=1)
+    try:
+        for r in pool.imap(run_case, cases):
+            print '{:<14} {:>5} {:<8} {:8.4f}s {:8.1f} MP/s {:8.1f} MB'.format(
+                r['filter'], r['size'], r['dtype'], r['best'],
+                r['megapixels_per_second'], r['peak_memory_bytes'] / 1e6)
+            results.append(r)
+    finally:
+        pool.close()
+        pool.join()
+
+    report = {
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.budget)
+        for r, ratio in regressions:
+            print 'Regression: {} {} {} is {:.2f}x slower'.format(
+                r['filter'], r['size'], r['dtype'], ratio)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,7 @@ import matplotlib.pyplot as plt
 pyximport.install(setup_args={'include_dirs': np.get_include()})
 
 import imeffect.preset as ime
+from imeffect.render import render_many
 
 
 def main():
@@ -25,17 +26,14 @@ def main():
     plt.subplots_adjust(left=0.02, right=0.98, bottom=0.02, top=0.94,
                         wspace=0.1, hspace=0.2)
 
-    for idx, name in enumerate(ime.__all__):
-        print 'Rendering filter: {}....'.format(name)
-
-        Filter = ime.__dict__.get(name)
-        f = Filter()
-        fimg = f(np.copy(img))
+    print 'Rendering filters....'
+    fimgs = render_many(img)
 
+    for idx, name in enumerate(ime.__all__):
         plt.subplot(3, 6, idx + 1)
         plt.title(name, fontsize=10)
         plt.axis('off')
-        plt.imshow(fimg)
+        plt.imshow(fimgs[name])
 
     plt.savefig('result.png')
 
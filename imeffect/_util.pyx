@@ -8,6 +8,7 @@
 
 import numpy as np
 cimport numpy as np
+cimport cython
 
 
 cdef inline np.double_t _lerp(np.double_t a, np.double_t b, np.double_t t):
@@ -17,27 +18,30 @@ cdef inline np.double_t _lerp(np.double_t a, np.double_t b, np.double_t t):
 cdef np.ndarray[np.int_t, ndim=1] _fill_missing_values(dict values, int end):
     cdef np.ndarray[np.double_t, ndim=1] result
     cdef unsigned int i, j
-    cdef tuple left, right
-    cdef double offset
+    cdef double left_x, left_y, right_x, right_y, offset
+    cdef bint found
 
     result = np.zeros(end + 1)
     for i in xrange(end + 1):
         if i in values:
             result[i] = values[i]
         elif i > 0:
-            left = (i - 1, result[i - 1])
-            right = None
+            left_x = i - 1
+            left_y = result[i - 1]
+            found = False
             for j in xrange(i, end + 1):
                 if j in values:
-                    right = (j, values[j])
+                    right_x = j
+                    right_y = values[j]
+                    found = True
                     break
 
-            if right is None:
+            if not found:
                 result[i:end + 1] = result[i - 1]
                 break
 
-            offset = (right[1] - left[1]) / (right[0] - left[0]) * (i - left[0])
-            result[i] = left[1] + offset
+            offset = (right_y - left_y) / (right_x - left_x) * (i - left_x)
+            result[i] = left_y + offset
 
     return np.round(result).astype(np.int)
 
@@ -67,9 +71,28 @@ cpdef np.ndarray[np.int_t, ndim=1] bezier(np.ndarray[np.int_t, ndim=2] cps,
     return _fill_missing_values(result, end)
 
 
-cpdef np.ndarray choose(np.ndarray a, np.ndarray choices, np.ndarray out):
-    cdef int idx, val
-    for idx, val in enumerate(choices):
-        out[a == idx] = val
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _gather(double[:] a, double[:] choices, double[:] out) nogil:
+    cdef Py_ssize_t i, k
+    cdef Py_ssize_t n = choices.shape[0]
+    cdef double v
+    for i in xrange(a.shape[0]):
+        v = a[i]
+        k = <Py_ssize_t> v
+        if k == v and 0 <= k < n:
+            out[i] = choices[k]
+
 
+cpdef np.ndarray choose(np.ndarray a, np.ndarray choices, np.ndarray out):
+    cdef np.ndarray values = np.ascontiguousarray(a, dtype=np.double).ravel()
+    cdef np.ndarray table = np.ascontiguousarray(choices, dtype=np.double)
+    cdef np.ndarray result = np.array(out, dtype=np.double).ravel()
+    cdef double[:] a_view = values
+    cdef double[:] choices_view = table
+    cdef double[:] out_view = result
+    with nogil:
+        _gather(a_view, choices_view, out_view)
+
+    out[...] = result.reshape(np.shape(out))
     return out
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# _util_numpy.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+# pure NumPy versions of the helpers in _util.pyx, used when the extension
+# module is not built
+
+import numpy as np
+
+__all__ = ('bezier',
+           'choose')
+
+
+def _round(x):
+    """Rounds half away from zero, like the built-in :func:`round`."""
+
+    r = np.floor(np.abs(x))
+    r += np.abs(x) - r >= 0.5
+    return np.copysign(r, x)
+
+
+def _fill_missing_values(values, end):
+    result = np.zeros(end + 1)
+    for i in xrange(end + 1):
+        if i in values:
+            result[i] = values[i]
+        elif i > 0:
+            left = (i - 1, result[i - 1])
+            right = None
+            for j in xrange(i, end + 1):
+                if j in values:
+                    right = (j, values[j])
+                    break
+
+            if right is None:
+                result[i:end + 1] = result[i - 1]
+                break
+
+            offset = (right[1] - left[1]) / (right[0] - left[0]) * (i - left[0])
+            result[i] = left[1] + offset
+
+    return np.round(result).astype(np.int)
+
+
+def bezier(cps, lower=0, upper=255):
+    t = (np.arange(1000) * 0.001).reshape((-1, 1))
+    p = np.repeat(np.asarray(cps, dtype=np.float)[np.newaxis], len(t), axis=0)
+    for j in xrange(p.shape[1] - 1, 0, -1):
+        p[:, :j, 0] = p[:, :j, 0] * (1 - t) + p[:, 1:j + 1, 0] * t
+        p[:, :j, 1] = p[:, :j, 1] * (1 - t) + p[:, 1:j + 1, 1] * t
+
+    idx = _round(p[:, 0, 0]).astype(np.int)
+    val = _round(np.clip(p[:, 0, 1], lower, upper))
+
+    # later samples overwrite earlier ones at the same index
+    idx, last = np.unique(idx[::-1], return_index=True)
+    val = val[::-1][last]
+
+    end = cps[-1][0]
+    return _fill_missing_values(dict(zip(idx.tolist(), val.tolist())), end)
+
+
+def choose(a, choices, out):
+    choices = np.asarray(choices)
+    k = a.astype(np.intp)
+    mask = (k == a) & (k >= 0) & (k < len(choices))
+    out[mask] = choices[k[mask]]
+    return out
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# arena.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+__all__ = ('Arena',
+           'using',
+           'current_arena',
+           'empty',
+           'release')
+
+_local = threading.local()
+
+
+class Arena(object):
+    """Thread-safe pool of scratch arrays, which are handed out by shape and
+    type and can be reused once released.
+
+    :class:`LayeredFilter <imeffect.base.LayeredFilter>` uses a temporary
+    arena for each call by default. To reuse scratch arrays across renders
+    (e.g. in a long-running worker rendering images of the same size), keep
+    an arena installed around the rendering loop::
+
+        with using(Arena(256 << 20)):
+            for img in imgs:
+                f(img)
+
+    :param max_bytes: memory budget of the released arrays kept for reuse in
+                      bytes, or ``None`` for no limit.
+    """
+
+    def __init__(self, max_bytes=None):
+        #: Memory budget of the released arrays kept for reuse in bytes.
+        self.max_bytes = max_bytes
+
+        # released arrays, from the least recently released one
+        self._free = []
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._free)
+
+    def empty(self, shape, dtype):
+        """Returns an uninitialized array of the given shape and type, reusing
+        a released one if possible.
+        """
+
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        with self._lock:
+            for i in xrange(len(self._free) - 1, -1, -1):
+                buf = self._free[i]
+                if buf.shape == shape and buf.dtype == dtype:
+                    del self._free[i]
+                    self._nbytes -= buf.nbytes
+                    return buf
+
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, buf):
+        """Returns an array obtained from :meth:`empty` for reuse.
+
+        The least recently released arrays are discarded once the budget is
+        exceeded. The array must not be used by the caller afterwards.
+        """
+
+        with self._lock:
+            self._free.append(buf)
+            self._nbytes += buf.nbytes
+            while self.max_bytes is not None and \
+                    self._nbytes > self.max_bytes:
+                self._nbytes -= self._free.pop(0).nbytes
+
+    def clear(self):
+        """Discards all released arrays."""
+
+        with self._lock:
+            del self._free[:]
+            self._nbytes = 0
+
+
+@contextmanager
+def using(arena):
+    """Makes filters and layers in the current thread draw their scratch
+    arrays from the given arena.
+
+    :param arena: an :class:`Arena`.
+    """
+
+    previous = getattr(_local, 'arena', None)
+    _local.arena = arena
+    try:
+        yield arena
+    finally:
+        _local.arena = previous
+
+
+def current_arena():
+    """Returns the arena used in the current thread, or ``None``.
+
+    .. seealso:: :func:`using`
+    """
+
+    return getattr(_local, 'arena', None)
+
+
+def empty(shape, dtype):
+    """Returns a scratch array of the given shape and type from the current
+    arena, or a newly allocated one if there is none.
+    """
+
+    arena = current_arena()
+    if arena is None:
+        return np.empty(shape, dtype=dtype)
+
+    return arena.empty(shape, dtype)
+
+
+def release(buf):
+    """Returns a scratch array obtained from :func:`empty` to the current
+    arena, if any.
+    """
+
+    arena = current_arena()
+    if arena is not None:
+        arena.release(buf)
@@ -8,8 +8,12 @@
 # Distributed under The BSD 3-Clause License
 #################################################
 
+import copy
+
 import numpy as np
 
+from .arena import Arena, current_arena, using
+
 __all__ = ('FilterBase',
            'BasicFilter',
            'LayeredFilter')
@@ -18,16 +22,66 @@ __all__ = ('FilterBase',
 class FilterBase(object):
     """Abstract base class for filters."""
 
+    #: Floating-point type in which images of integer types are processed
+    #: when they cannot be mapped through lookup tables.
+    #:
+    #: This attribute can be overridden by derived classes or instances.
+    _FLOAT_DTYPE = np.float32
+
     def __call__(self, img):
         """Applies filter effect to the given image (in place).
 
         Derived class should override this method to implement the filter
         effect.
 
+        Floating-point images are processed in their own precision, so
+        passing ``float32`` images halves the memory traffic compared with
+        ``float64`` ones. Images of unsigned integer types (such as
+        ``uint8`` or ``uint16``) are processed by :meth:`_process_integer`
+        and keep their type.
+
         .. warning:: This method will modify the passed image directly.
         """
         return img
 
+    def apply_batch(self, imgs):
+        """Applies filter effect to a stack of images of the same size (in
+        place), processing the whole stack in each vectorized pass.
+
+        :param imgs: an (*N*, *H*, *W*, 3) array.
+        """
+        if imgs.ndim != 4:
+            raise ValueError('expected an (N, H, W, 3) array')
+
+        return self(imgs)
+
+    def _process_integer(self, img):
+        """Applies filter effect to the given image of integer type (in
+        place).
+
+        Point-wise filters are baked into lookup tables over all levels of the
+        image type, which are cached. Other filters are applied to a
+        floating-point copy of the image.
+
+        .. seealso:: :func:`process_integer <imeffect.lut.process_integer>`
+        """
+        from .lut import process_integer
+
+        return process_integer(self, img)
+
+    def _rescaled(self, factor):
+        """Returns a filter equivalent to this one for an image scaled by the
+        given factor, or this filter itself if it does not depend on the pixel
+        scale.
+
+        Derived class should override this method if some of its parameters
+        are lengths in pixels (such as blur radii).
+
+        .. seealso:: :func:`rescale_layers
+                     <imeffect.resample.rescale_layers>`
+        """
+        return self
+
 
 class BasicFilter(FilterBase):
     """Abstract base class for basic filters.
@@ -35,12 +89,68 @@ class BasicFilter(FilterBase):
     The :meth:`__call__` method will restrict all pixel values between 0 to 1.
     """
 
+    #: Whether each output pixel is a deterministic function of the same input
+    #: pixel only.
+    #:
+    #: Derived class should override this attribute if so. Runs of point-wise
+    #: filters can be fused by :meth:`LayeredFilter.compile`.
+    _POINTWISE = False
+
+    #: Whether each channel of an output pixel only depends on the same
+    #: channel of the input pixel.
+    #:
+    #: Channel-wise filters must be point-wise as well.
+    _CHANNELWISE = False
+
     def __call__(self, img):
+        if img.dtype.kind == 'u':
+            return self._process_integer(img)
+
         img = self._process(img)
-        img[img > 1] = 1
-        img[img < 0] = 0
+        np.clip(img, 0, 1, out=img)
         return img
 
+    def _halo(self):
+        """Returns how many pixels the filter reads beyond each output pixel
+        in every direction, or ``None`` if unknown.
+
+        Derived class should override this method if it is neither point-wise
+        nor unknown. Filters which depend on the pixel position should get it
+        from :func:`current_window <imeffect.tile.current_window>`.
+        """
+        return 0 if self._POINTWISE else None
+
+    def _range(self, lower, upper):
+        """Returns the (*lower*, *upper*) bounds of the outputs (before
+        clamping) given the bounds of the inputs, or ``None`` if unknown.
+
+        Derived class should override this method if the bounds are known
+        regardless of rounding errors. Filters which keep the outputs between
+        0 and 1 are not clamped in compiled pipelines (see
+        :meth:`LayeredFilter.compile`).
+        """
+        return None
+
+    def _affine(self):
+        """Returns the filter as a (3, 4) matrix [*A* | *b*] if it maps each
+        pixel *x* to *A* *x* + *b* (before clamping), or ``None`` otherwise.
+
+        Derived class should override this method if it is affine.
+        Consecutive affine filters can be folded into one by
+        :meth:`LayeredFilter.compile`.
+        """
+        return None
+
+    def _constant(self):
+        """Returns the color of every output pixel as a (1, 1, 3) array if it
+        does not depend on the input image, or ``None`` otherwise.
+
+        Derived class should override this method if its output is constant.
+        Filter layers producing constant colors are blended without
+        materialising the whole layer.
+        """
+        return None
+
     def _process(self, img):
         """Applies filter effect to the given image.
 
@@ -67,8 +177,136 @@ class LayeredFilter(FilterBase):
         self._layers = self._LAYERS
 
     def __call__(self, img):
-        origin_img = np.copy(img)
+        if img.dtype.kind == 'u':
+            return self._process_integer(img)
+
+        if current_arena() is None:
+            with using(Arena()):
+                return self._apply_layers(img)
+
+        return self._apply_layers(img)
+
+    def _apply_layers(self, img):
+        """Applies the layers to the image, snapshotting the original image
+        only if some layer reads it.
+
+        .. seealso:: :func:`reads_origin <imeffect.compiler.reads_origin>`
+        """
+        from .compiler import reads_origin
+
+        snapshot = any(reads_origin(l) for l in self._layers)
+        if snapshot:
+            origin_img = current_arena().empty(img.shape, img.dtype)
+            origin_img[...] = img
+        else:
+            origin_img = img
+
         for l in self._layers:
             l(img, origin_img)
 
+        if snapshot:
+            current_arena().release(origin_img)
+
         return img
+
+    def compile(self):
+        """Fuses runs of consecutive point-wise layers, so that each run
+        passes over the image only once, after merging consecutive
+        :class:`Curves <imeffect.basic.Curves>` filters into one table and
+        folding consecutive affine filters into one color matrix. Filters
+        whose outputs provably stay between 0 and 1 are not clamped.
+
+        :return: this filter.
+
+        .. seealso::
+           :func:`compile_layers <imeffect.compiler.compile_layers>`
+        """
+        from .compiler import compile_layers
+
+        self._layers = compile_layers(self._layers)
+        return self
+
+    def bake(self, size=None):
+        """Evaluates this filter once on a lattice of colors and returns an
+        equivalent lookup-table filter.
+
+        All layers must be point-wise. Channel-wise filters are baked into
+        per-channel 1D tables, others into a 3D color cube.
+
+        :param size: number of lattice points along each axis.
+        :return: a :class:`LUT1D <imeffect.lut.LUT1D>` or
+                 :class:`LUT3D <imeffect.lut.LUT3D>` filter.
+
+        .. seealso:: :func:`bake <imeffect.lut.bake>`
+        """
+        from .lut import bake
+
+        return bake(self, size)
+
+    def preview(self, img, size=256):
+        """Applies this filter to a downscaled proxy of the image.
+
+        The proxy is box-resampled so that its longer side has the given
+        size, and parameters which are lengths in pixels are scaled
+        accordingly, so that the result looks like the full-size result
+        downscaled. The image itself is left untouched.
+
+        :param img: the image.
+        :param size: size of the longer side of the proxy in pixels. Images
+                     which are not larger are filtered at their own size.
+        :return: the filtered proxy.
+
+        .. seealso:: :meth:`render_async`
+        """
+        from .resample import resize, scale_factor
+
+        h, w = img.shape[-3:-1]
+        if max(h, w) <= size:
+            return self(img.copy())
+
+        ratio = float(size) / max(h, w)
+        shape = (max(1, int(round(h * ratio))), max(1, int(round(w * ratio))))
+        proxy = resize(img, shape)
+        return self._rescaled(scale_factor((h, w), shape))(proxy)
+
+    def render(self, img, shape, stage=None):
+        """Applies this filter to the image and resizes the result to the
+        given size, running most layers at the smaller of both sizes.
+
+        :param img: the image, which is left untouched.
+        :param shape: (*height*, *width*) of the output image.
+        :param stage: number of leading layers run at the size of the image,
+                      or ``None`` to choose automatically.
+        :return: a new image of the same type as the given one.
+
+        .. seealso:: :func:`render_resized <imeffect.render.render_resized>`
+                     for the tolerance of the result.
+        """
+        from .render import render_resized
+
+        return render_resized(self, img, shape, stage)
+
+    def render_async(self, img):
+        """Applies this filter to a copy of the image in a background thread,
+        e.g. to refine a :meth:`preview`.
+
+        :param img: the image, which is left untouched.
+        :return: a :class:`multiprocessing.pool.AsyncResult`, whose
+                 ``get()`` method returns the filtered image.
+
+        .. seealso:: :func:`render_async <imeffect.render.render_async>`
+        """
+        from .render import render_async
+
+        return render_async(self, img)
+
+    def _rescaled(self, factor):
+        from .resample import rescale_layers
+
+        layers = rescale_layers(self._layers, factor)
+        if all(l is m for l, m in zip(layers, self._layers)):
+            return self
+
+        f = copy.copy(self)
+        f._layers = layers
+        return f
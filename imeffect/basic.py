@@ -8,14 +8,26 @@
 # Distributed under The BSD 3-Clause License
 #################################################
 
+import copy
+
 import numpy as np
 from numpy.linalg import norm
-from scipy.ndimage import gaussian_filter
-from scipy.signal import convolve2d
-from skimage.color import rgb2hsv, hsv2rgb
 
+from . import arena
 from .base import BasicFilter
-from ._util import bezier, choose
+from .cache import LRUCache
+from .convolve import convolve, gaussian
+from .tile import current_window
+
+try:
+    from ._util import bezier, choose
+except ImportError:  # the extension module is not built
+    from ._util_numpy import bezier, choose
+
+try:
+    from numpy.random import default_rng
+except ImportError:  # NumPy < 1.17
+    default_rng = None
 
 __all__ = ('FillColor',
            'Brightness',
@@ -38,6 +50,9 @@ __all__ = ('FillColor',
            'Sharpen',
            'GaussianBlur')
 
+# types in which numpy.random.Generator draws random numbers directly
+_RNG_DTYPES = (np.dtype(np.float32), np.dtype(np.float64))
+
 
 class FillColor(BasicFilter):
     """Fills the image with a single RGB color.
@@ -46,11 +61,20 @@ class FillColor(BasicFilter):
                   *R*, *G*, and *B* are integers range from 0 to 255.
     """
 
+    _POINTWISE = True
+    _CHANNELWISE = True
+
     def __init__(self, rgb):
         self._rgb = np.array(rgb).reshape((1, 1, 3)) / 255.0
 
+    def _constant(self):
+        return self._rgb
+
+    def _range(self, lower, upper):
+        return self._rgb.min(), self._rgb.max()
+
     def _process(self, img):
-        img[:, :, :] = self._rgb
+        img[...] = self._rgb
         return img
 
 
@@ -60,9 +84,15 @@ class Brightness(BasicFilter):
     :param adjust: float range from -100 to 100.
     """
 
+    _POINTWISE = True
+    _CHANNELWISE = True
+
     def __init__(self, adjust):
         self._adjust = adjust * 0.01
 
+    def _affine(self):
+        return np.hstack((np.eye(3), np.full((3, 1), self._adjust)))
+
     def _process(self, img):
         img += self._adjust
         return img
@@ -74,12 +104,14 @@ class Saturation(BasicFilter):
     :param adjust: float range from -100 to 100.
     """
 
+    _POINTWISE = True
+
     def __init__(self, adjust):
         self._adjust = adjust * -0.01
 
     def _process(self, img):
-        max = np.amax(img, axis=2)
-        img += (np.atleast_3d(max) - img) * self._adjust
+        max = np.amax(img, axis=-1)
+        img += (max[..., np.newaxis] - img) * self._adjust
         return img
 
 
@@ -90,28 +122,35 @@ class Vibrance(BasicFilter):
     :param adjust: float range from -100 to 100.
     """
 
+    _POINTWISE = True
+
     def __init__(self, adjust):
         self._adjust = adjust * -0.01
 
     def _process(self, img):
-        max = np.amax(img, axis=2)
-        avg = np.mean(img, axis=2)
+        max = np.amax(img, axis=-1)
+        avg = np.mean(img, axis=-1)
         amt = 2 * abs(max - avg) * self._adjust
-        img += (np.atleast_3d(max) - img) * np.atleast_3d(amt)
+        img += (max[..., np.newaxis] - img) * amt[..., np.newaxis]
         return img
 
 
 class Greyscale(BasicFilter):
     """Computes luminance of an RGB image."""
 
+    _POINTWISE = True
+
+    def _affine(self):
+        return np.array([[0.299, 0.587, 0.114, 0]] * 3)
+
     def _process(self, img):
-        r = img[:, :, 0]
-        g = img[:, :, 1]
-        b = img[:, :, 2]
+        r = img[..., 0]
+        g = img[..., 1]
+        b = img[..., 2]
         grey = 0.299 * r + 0.587 * g + 0.114 * b
-        img[:, :, 0] = grey
-        img[:, :, 1] = grey
-        img[:, :, 2] = grey
+        img[..., 0] = grey
+        img[..., 1] = grey
+        img[..., 2] = grey
         return img
 
 
@@ -121,9 +160,16 @@ class Contrast(BasicFilter):
     :param adjust: float range from -100 to 100.
     """
 
+    _POINTWISE = True
+    _CHANNELWISE = True
+
     def __init__(self, adjust):
         self._adjust = ((adjust + 100) * 0.01) ** 2
 
+    def _affine(self):
+        return np.hstack((np.eye(3) * self._adjust,
+                          np.full((3, 1), 0.5 * (1 - self._adjust))))
+
     def _process(self, img):
         img *= self._adjust
         img += 0.5 * (1 - self._adjust)
@@ -133,18 +179,65 @@ class Contrast(BasicFilter):
 class Hue(BasicFilter):
     """Adjusts the hue of the image.
 
+    The hue is rotated in a single pass over the image, without converting it
+    to HSV and back. The result agrees with the round trip through
+    :func:`skimage.color.rgb2hsv` and :func:`skimage.color.hsv2rgb` within a
+    few units in the last place (less than 1e-15 for images of type
+    ``float64`` in [0, 1]).
+
     :param adjust: float range from 0 to 100.
     """
 
+    _POINTWISE = True
+
+    # offsets of the red, green and blue channels on the hue circle (in
+    # sixths), see https://en.wikipedia.org/wiki/HSL_and_HSV#HSV_to_RGB_alternative
+    _OFFSETS = np.array([5, 3, 1])
+
     def __init__(self, adjust):
         self._adjust = adjust * 0.01
 
+    def _range(self, lower, upper):
+        # each channel ranges from v - c = min(r, g, b) to v = max(r, g, b)
+        if lower < 0:
+            return None
+
+        return 0.0, upper
+
     def _process(self, img):
-        hsv = rgb2hsv(img)
-        h = hsv[:, :, 0] + self._adjust
+        r = img[..., 0]
+        g = img[..., 1]
+        b = img[..., 2]
+        v = np.amax(img, axis=-1)
+        c = v - np.amin(img, axis=-1)
+
+        # the same precedence as skimage: blue over green over red
+        is_b = b == v
+        is_g = (g == v) & ~is_b
+        num = g - b
+        np.subtract(b, r, out=num, where=is_g)
+        np.subtract(r, g, out=num, where=is_b)
+        offset = np.where(is_b, 4, np.where(is_g, 2, 0)).astype(img.dtype)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            num /= c
+        num += offset
+        h = num
+        h /= 6
+        np.mod(h, 1, out=h)
+        h[c == 0] = 0
+        h += self._adjust
         h[h > 1] -= 1
-        hsv[:, :, 0] = h
-        img[:, :, :] = hsv2rgb(hsv)
+        h *= 6
+
+        # each channel is v - c * clamp(min(k, 4 - k), 0, 1), where k is the
+        # distance of its offset from the hue
+        k = h[..., np.newaxis] + self._OFFSETS.astype(img.dtype)
+        np.mod(k, 6, out=k)
+        np.minimum(k, 4 - k, out=k)
+        np.clip(k, 0, 1, out=k)
+        k *= c[..., np.newaxis]
+        np.subtract(v[..., np.newaxis], k, out=img)
         return img
 
 
@@ -156,18 +249,34 @@ class Colorize(BasicFilter):
     :param level: float range from 0 to 100.
     """
 
+    _POINTWISE = True
+    _CHANNELWISE = True
+
     def __init__(self, rgb, level):
         self._offset = np.array(rgb).reshape((1, 1, 3)) / 255.0
         self._level = level * 0.01
 
+    def _affine(self):
+        offset = self._offset.reshape((3, 1)) * self._level
+        return np.hstack((np.eye(3) * (1 - self._level), offset))
+
     def _process(self, img):
-        img -= (img - self._offset) * self._level
+        img -= (img - self._offset.astype(img.dtype)) * self._level
         return img
 
 
 class Invert(BasicFilter):
     """Inverts color in the image."""
 
+    _POINTWISE = True
+    _CHANNELWISE = True
+
+    def _affine(self):
+        return np.hstack((-np.eye(3), np.ones((3, 1))))
+
+    def _range(self, lower, upper):
+        return 1 - upper, 1 - lower
+
     def _process(self, img):
         img -= 1
         img *= -1
@@ -180,6 +289,8 @@ class Sepia(BasicFilter):
     :param adjust: float range from 0 to 100.
     """
 
+    _POINTWISE = True
+
     def __init__(self, adjust):
         adjust = adjust * 0.01
         self._sr = np.array([[[1 - 0.607 * adjust,
@@ -192,10 +303,23 @@ class Sepia(BasicFilter):
                                0.534 * adjust,
                                1 - 0.869 * adjust]]])
 
+    def _affine(self):
+        # each channel is computed from the already updated ones
+        matrix = np.eye(3)
+        for c, row in enumerate((self._sr, self._sg, self._sb)):
+            step = np.eye(3)
+            step[c] = row.ravel()
+            matrix = np.dot(step, matrix)
+
+        return np.hstack((matrix, np.zeros((3, 1))))
+
     def _process(self, img):
-        img[:, :, 0] = np.sum(img * self._sr, axis=2)
-        img[:, :, 1] = np.sum(img * self._sg, axis=2)
-        img[:, :, 2] = np.sum(img * self._sb, axis=2)
+        sr = self._sr.astype(img.dtype)
+        sg = self._sg.astype(img.dtype)
+        sb = self._sb.astype(img.dtype)
+        img[..., 0] = np.sum(img * sr, axis=-1)
+        img[..., 1] = np.sum(img * sg, axis=-1)
+        img[..., 2] = np.sum(img * sb, axis=-1)
         return img
 
 
@@ -205,9 +329,18 @@ class Gamma(BasicFilter):
     :param adjust: float range from 0 to infinity.
     """
 
+    _POINTWISE = True
+    _CHANNELWISE = True
+
     def __init__(self, adjust):
         self._adjust = adjust
 
+    def _range(self, lower, upper):
+        if lower < 0 or self._adjust < 0:
+            return None
+
+        return lower ** self._adjust, upper ** self._adjust
+
     def _process(self, img):
         img **= self._adjust
         return img
@@ -216,16 +349,101 @@ class Gamma(BasicFilter):
 class Noise(BasicFilter):
     """Adds random noise to the image.
 
+    By default, random numbers are drawn from the global generator of NumPy,
+    so the noise follows :func:`numpy.random.seed`. Given a seed, each filter
+    draws from its own generator instead (a :class:`numpy.random.Generator`
+    if available, or a :class:`numpy.random.RandomState` otherwise), directly
+    in the type of the image.
+
+    Given the size of a noise texture, the noise is precomputed once as a
+    square texture of that size and repeated over the image. The noise of
+    each pixel then only depends on its position, so the output is the same
+    for every call and under :func:`apply_tiled <imeffect.tile.apply_tiled>`.
+
     :param adjust: float range from 0 to 100.
                    The bigger the number the stronger the noise.
+    :param seed: seed of the random number generator of this filter.
+    :param texture: size of the noise texture.
     """
 
-    def __init__(self, adjust):
+    def __init__(self, adjust, seed=None, texture=None):
         self._adjust = abs(adjust) * 0.01
+        self._texture = texture
+        self._textures = {}
+        if seed is None:
+            self._rng = None
+        elif default_rng is not None:
+            self._rng = default_rng(seed)
+        else:
+            self._rng = np.random.RandomState(seed)
+
+    def _halo(self):
+        return 0
+
+    def _rescaled(self, factor):
+        # averaging pixels when shrinking the image weakens the noise
+        if factor >= 1:
+            return self
+
+        f = copy.copy(self)
+        f._adjust = self._adjust * factor
+        f._textures = {}
+        return f
+
+    def _random(self, shape, dtype):
+        """Draws uniform random numbers in [0, 1) into a scratch array.
+
+        Generators without an output argument fill the array block by block,
+        in the same order as a single draw of the whole array.
+        """
+        from .compiler import row_slices
+
+        dtype = np.dtype(dtype)
+        out = arena.empty(shape, dtype)
+        if self._rng is None:
+            random_sample = np.random.random_sample
+        elif default_rng is not None and dtype in _RNG_DTYPES:
+            return self._rng.random(dtype=dtype, out=out)
+        else:
+            random_sample = self._rng.random_sample
+
+        for idx in row_slices(shape):
+            block = out[idx]
+            block[...] = random_sample(block.shape)
+
+        return out
+
+    def _get_texture(self, dtype):
+        texture = self._textures.get(dtype)
+        if texture is None:
+            size = self._texture
+            texture = self._random((size, size, 3), dtype)
+            texture *= 2 * self._adjust
+            texture -= self._adjust
+            self._textures[dtype] = texture
+
+        return texture
 
     def _process(self, img):
-        noisy = np.random.rand(*img.shape) * 2 * self._adjust - self._adjust
+        if self._texture is None:
+            noisy = self._random(img.shape, img.dtype)
+            noisy *= 2 * self._adjust
+            noisy -= self._adjust
+            img += noisy
+            arena.release(noisy)
+            return img
+
+        texture = self._get_texture(img.dtype)
+        top, left = current_window(img)[:2]
+        rows, cols = img.shape[-3:-1]
+        size = self._texture
+        row_idx = np.arange(top, top + rows) % size
+        col_idx = np.arange(left, left + cols) % size
+
+        noisy = arena.empty((rows, cols, 3), img.dtype)
+        texture.take(row_idx, axis=0).take(col_idx, axis=1, out=noisy)
         img += noisy
+        arena.release(noisy)
         return img
 
 
@@ -235,9 +453,21 @@ class Clip(BasicFilter):
     :param adjust: float range from 0 to 100.
     """
 
+    _POINTWISE = True
+    _CHANNELWISE = True
+
     def __init__(self, adjust):
         self._adjust = abs(adjust) * 0.01
 
+    def _range(self, lower, upper):
+        if lower < self._adjust:
+            lower = 0.0
+
+        if upper > 1 - self._adjust:
+            upper = 1.0
+
+        return lower, upper
+
     def _process(self, img):
         img[img > 1 - self._adjust] = 1
         img[img < self._adjust] = 0
@@ -252,55 +482,242 @@ class Channels(BasicFilter):
     :param blue: float range from 0 to 100.
     """
 
+    _POINTWISE = True
+    _CHANNELWISE = True
+
     def __init__(self, red=0, green=0, blue=0):
         self._adjust = np.array([red, green, blue]) * 0.01
 
+    def _affine(self):
+        adjust = self._adjust
+        offset = np.maximum(adjust, 0).reshape((3, 1))
+        return np.hstack((np.diag(1 - abs(adjust)), offset))
+
     def _process(self, img):
         for dim in xrange(3):
-            adjust = self._adjust[dim]
+            adjust = float(self._adjust[dim])
             if adjust > 0:
-                img[:, :, dim] += (1 - img[:, :, dim]) * adjust
+                img[..., dim] += (1 - img[..., dim]) * adjust
             elif adjust < 0:
-                img[:, :, dim] -= img[:, :, dim] * abs(adjust)
+                img[..., dim] -= img[..., dim] * abs(adjust)
 
         return img
 
 
+def _sample_bezier(cps, resolution):
+    """Samples the Bezier curve of the given control points at *resolution*
+    evenly spaced inputs from 0 to 255, without rounding, and returns the
+    outputs divided by 255.
+    """
+
+    cps = np.asarray(cps, dtype=np.float)
+    t = np.linspace(0, 1, 8 * resolution).reshape((-1, 1, 1))
+    p = np.repeat(cps[np.newaxis], t.shape[0], axis=0)
+    for j in xrange(len(cps) - 1, 0, -1):
+        p[:, :j] = p[:, :j] * (1 - t) + p[:, 1:j + 1] * t
+
+    x = np.maximum.accumulate(p[:, 0, 0])
+    y = np.clip(p[:, 0, 1], 0, 255)
+    grid = np.arange(resolution) * (255 / (resolution - 1.0))
+    return np.interp(grid, x, y) / 255.0
+
+
 class Curves(BasicFilter):
     """Maps one color value to another by using the Bezier curve equation.
 
+    By default, each modified channel is quantised to 256 levels and mapped
+    through its own table, all channels in a single gather. Given a
+    resolution, the curve is sampled at that many inputs without rounding and
+    linearly interpolated instead, which avoids banding.
+
+    Sampled curves are shared by all filters with the same control points
+    and resolution.
+
     :param chans: a list of indices represents the channels to modify with the
                   filter.
     :param cps: a list of (*X*, *Y*) tuple represents the point coordinates.
                 *X* and *Y* are integers range from 0 to 255.
+    :param resolution: number of entries of the interpolated tables, such as
+                       1024 or 4096.
     """
 
-    def __init__(self, chans, cps):
-        self._chans = chans
+    _POINTWISE = True
+    _CHANNELWISE = True
+
+    # sampled curves, keyed by control points and resolution
+    _curves = {}
+
+    def __init__(self, chans, cps, resolution=None):
+        self._chans = tuple(sorted(set(chans)))
         self._cps = np.array(cps, dtype=np.int)
-        self._curve = None
+        self._resolution = resolution
+        self._map = None
+        self._tables = {}
+
+    @staticmethod
+    def _from_map(chans, mapping, resolution):
+        curves = Curves.__new__(Curves)
+        curves._chans = tuple(chans)
+        curves._cps = None
+        curves._resolution = resolution
+        curves._map = mapping
+        curves._tables = {}
+        return curves
 
     def _get_bezier(self):
-        if self._curve is None:
+        key = (tuple(map(tuple, self._cps.tolist())), self._resolution)
+        curve = Curves._curves.get(key)
+        if curve is not None:
+            return curve
+
+        if self._resolution is None:
             curve = bezier(self._cps, 0, 255)
 
             start = self._cps[0]
             curve[:start[0]] = start[1]
 
             end = self._cps[-1]
-            self._curve = np.concatenate((curve, [end[1]] * (255 - end[0])))
-
-        return self._curve
+            curve = np.concatenate((curve, [end[1]] * (255 - end[0])))
+        else:
+            curve = _sample_bezier(self._cps, self._resolution)
+
+        Curves._curves[key] = curve
+        return curve
+
+    def _get_map(self):
+        """Returns a (3, *N*) array mapping each channel of the *N* inputs to
+        its output. Without a resolution, inputs and outputs are the 256
+        levels. Otherwise, inputs are evenly spaced from 0 to 1 and outputs
+        range from 0 to 1. Channels which are not modified map to themselves.
+        """
+
+        if self._map is None:
+            if self._resolution is None:
+                mapping = np.tile(np.arange(256), (3, 1))
+            else:
+                grid = np.arange(self._resolution) / (self._resolution - 1.0)
+                mapping = np.tile(grid, (3, 1))
+
+            mapping[list(self._chans)] = self._get_bezier()
+            self._map = mapping
+
+        return self._map
+
+    def _get_table(self, dtype):
+        """Returns the outputs of the modified channels for each input and
+        their differences to the next ones as flattened (*N*, *K*) arrays.
+        """
+
+        table = self._tables.get(dtype)
+        if table is None:
+            outputs = self._get_map()[list(self._chans)].T
+            if self._resolution is None:
+                outputs = outputs / 255.0
+
+            slopes = np.diff(outputs, axis=0)
+            table = (outputs.astype(dtype).ravel(),
+                     slopes.astype(dtype).ravel())
+            self._tables[dtype] = table
+
+        return table
+
+    def _range(self, lower, upper):
+        # interpolated tables are not bounded regardless of rounding errors
+        if self._resolution is not None:
+            return None
+
+        if not self._chans:
+            return lower, upper
+
+        levels = self._get_map()[list(self._chans)]
+        bounds = (levels.min() / 255.0, levels.max() / 255.0)
+        if len(self._chans) < 3:
+            # unmodified channels keep their bounds
+            bounds = (min(lower, bounds[0]), max(upper, bounds[1]))
+
+        return bounds
+
+    def _evaluate(self, values):
+        """Evaluates the curves of all channels on a (3, *M*) array of
+        values range from 0 to 1.
+        """
+
+        mapping = self._get_map()
+        rows = np.arange(3)[:, np.newaxis]
+        if self._resolution is None:
+            idx = np.rint(np.clip(values, 0, 1) * 255).astype(np.intp)
+            return mapping[rows, idx] / 255.0
+
+        n = self._resolution - 1
+        x = np.clip(values, 0, 1) * n
+        idx = np.minimum(x.astype(np.intp), n - 1)
+        x -= idx
+        lower = mapping[rows, idx]
+        return lower + (mapping[rows, idx + 1] - lower) * x
+
+    def compose(self, other):
+        """Returns curves equivalent to applying these curves and then the
+        other ones.
+
+        Curves without a resolution output exactly the 256 levels, so
+        composing two of them gives the same results as applying both.
+        Otherwise, the composition is sampled at the higher resolution of
+        the two (256 for curves without one) and linearly interpolated.
+
+        :param other: a :class:`Curves` filter.
+        """
+
+        chans = sorted(set(self._chans) | set(other._chans))
+        if self._resolution is None and other._resolution is None:
+            rows = np.arange(3)[:, np.newaxis]
+            mapping = other._get_map()[rows, self._get_map()]
+            return Curves._from_map(chans, mapping, None)
+
+        resolution = max(self._resolution or 256, other._resolution or 256)
+        grid = np.arange(resolution) / (resolution - 1.0)
+        values = np.tile(grid, (3, 1))
+        mapping = other._evaluate(self._evaluate(values))
+        return Curves._from_map(chans, mapping, resolution)
 
     def _process(self, img):
-        curve = self._get_bezier()
-        idx = np.around(img * 255)
-        for c in self._chans:
-            channel = img[:, :, c]
-            channel_idx = idx[:, :, c]
-            choose(channel_idx, curve, channel)
-            img[:, :, c] = channel / 255.0
+        chans = self._chans
+        if not chans:
+            return img
+
+        n = len(chans)
+        values = img if n == 3 else img[..., list(chans)]
+        outputs, slopes = self._get_table(img.dtype)
+        last = len(outputs) // n - 1
+
+        x = np.multiply(values, last, out=arena.empty(values.shape, img.dtype))
+        np.clip(x, 0, last, out=x)
+        if self._resolution is None:
+            np.rint(x, out=x)
+
+        idx = arena.empty(values.shape, np.intp)
+        idx[...] = x
+        if self._resolution is not None:
+            # x holds the interpolation weights of the next entries
+            np.minimum(idx, last - 1, out=idx)
+            x -= idx
+
+        idx *= n
+        idx += np.arange(n)
+        if self._resolution is None:
+            outputs.take(idx, out=x)
+        else:
+            slope = slopes.take(idx, out=arena.empty(values.shape, img.dtype))
+            x *= slope
+            x += outputs.take(idx, out=slope)
+            arena.release(slope)
+
+        if n == 3:
+            img[...] = x
+        else:
+            img[..., list(chans)] = x
 
+        arena.release(x)
+        arena.release(idx)
         return img
 
 
@@ -308,9 +725,12 @@ class Exposure(Curves):
     """Adjusts the exposure of the image.
 
     :param adjust: float range from -100 to 100.
+    :param resolution: number of entries of the interpolated tables.
+
+    .. seealso:: :class:`Curves`
     """
 
-    def __init__(self, adjust):
+    def __init__(self, adjust, resolution=None):
         p = abs(adjust) * 0.01
         if adjust > 0:
             ctrl1 = (0, p * 255)
@@ -321,7 +741,7 @@ class Exposure(Curves):
 
         chans = (0, 1, 2)
         cps = ((0, 0), ctrl1, ctrl2, (255, 255))
-        super(Exposure, self).__init__(chans, cps)
+        super(Exposure, self).__init__(chans, cps, resolution)
 
 
 class Posterize(BasicFilter):
@@ -332,23 +752,46 @@ class Posterize(BasicFilter):
                    The smaller the number the fewer the tones.
     """
 
+    _POINTWISE = True
+    _CHANNELWISE = True
+
     def __init__(self, adjust):
         self._adjust = float(adjust)
 
+    def _range(self, lower, upper):
+        if lower < 0 or self._adjust <= 0:
+            return None
+
+        return (np.floor(lower * self._adjust) / self._adjust,
+                np.ceil(upper * self._adjust) / self._adjust)
+
     def _process(self, img):
-        img[:, :, :] = np.round(img * self._adjust) / self._adjust
+        img[...] = np.round(img * self._adjust) / self._adjust
         return img
 
 
 class Vignette(BasicFilter):
     """Applies vignette effect to the image.
 
+    The size of the effect is relative to the image size, so it does not
+    depend on the pixel scale.
+
+    The exponent maps of the effect are kept in :attr:`mask_cache`, keyed by
+    the image size, the parameters and the image type. Maps are only cached
+    when the filter is applied to whole images, and strips of a larger image
+    (see :func:`apply_tiled <imeffect.tile.apply_tiled>`) read a cached map
+    if any, or compute their own regions otherwise.
+
     :param scale: float range from 0 to 100.
     :param strength: float range from 0 to 100.
     """
 
     _curve = None
 
+    #: Cache of exponent maps. Its memory budget can be changed through
+    #: ``Vignette.mask_cache.max_bytes``.
+    mask_cache = LRUCache(128 << 20)
+
     def __init__(self, scale, strength=60):
         self._scale = scale * 0.01
         self._strength = strength * 0.01
@@ -356,32 +799,60 @@ class Vignette(BasicFilter):
             cps = np.array(((0, 1), (30, 30), (70, 60), (100, 80)))
             Vignette._curve = bezier(cps)
 
-    def _process(self, img):
-        h, w, d = img.shape
+    def _halo(self):
+        return 0
+
+    def _exponents(self, top, left, rows, cols, h, w, dtype):
+        """Computes the exponent map of the given region of an image of the
+        given size, as a (*mask*, *exponents*) tuple; pixels outside the mask
+        are left unchanged.
+        """
+
         size = min(h, w) * self._scale
         center = (h * 0.5, w * 0.5)
         start = norm(center)
         end = start - size
 
-        dx = np.array(range(h)).reshape((h, 1)) - center[0]
-        dy = np.array(range(w)).reshape((1, w)) - center[1]
-        dx = np.tile(dx, (1, w))
-        dy = np.tile(dy, (h, 1))
-        d = np.sqrt(dx ** 2 + dy ** 2)
+        dx = np.arange(top, top + rows, dtype=dtype).reshape((rows, 1))
+        dy = np.arange(left, left + cols, dtype=dtype).reshape((1, cols))
+        d = np.sqrt((dx - center[0]) ** 2 + (dy - center[1]) ** 2)
 
         b = d > end
         idx = np.round((d[b] - end) / size * 100).astype(np.int)
 
-        p = np.zeros(idx.shape, dtype=np.float)
+        p = np.zeros(idx.shape, dtype=dtype)
         choose(idx, Vignette._curve, p)
 
         p *= 0.1 * self._strength
         p[p < 1] = 1.0
-        for i in xrange(3):
-            channel = img[:, :, i]
-            channel[b] **= p
-            img[:, :, i] = channel
 
+        exponents = np.ones((rows, cols), dtype=dtype)
+        exponents[b] = p
+        return b, exponents
+
+    def _process(self, img):
+        top, left, h, w = current_window(img)
+        rows, cols = img.shape[-3:-1]
+        key = (h, w, self._scale, self._strength, img.dtype.str)
+        cached = Vignette.mask_cache.get(key)
+        if cached is None:
+            # only whole images fill the cache, so that strips of a tiled
+            # image never build the full-size map
+            nbytes = h * w * (img.dtype.itemsize + 1)
+            if rows == h and cols == w and \
+                    nbytes <= Vignette.mask_cache.max_bytes:
+                cached = self._exponents(0, 0, h, w, h, w, img.dtype)
+                Vignette.mask_cache.put(key, cached)
+            else:
+                b, exponents = self._exponents(top, left, rows, cols, h, w,
+                                               img.dtype)
+
+        if cached is not None:
+            region = (slice(top, top + rows), slice(left, left + cols))
+            b, exponents = cached[0][region], cached[1][region]
+
+        np.power(img, exponents[..., np.newaxis], out=img,
+                 where=b[..., np.newaxis])
         return img
 
 
@@ -397,11 +868,20 @@ class Sharpen(BasicFilter):
                                  [-adjust, 4 * adjust + 1, -adjust],
                                  [0, -adjust, 0]])
 
+    def _halo(self):
+        return 1
+
+    def _rescaled(self, factor):
+        # the kernel approximates the Laplacian, which scales with the square
+        # of the pixel size
+        f = copy.copy(self)
+        identity = np.zeros_like(self._kernel)
+        identity[1, 1] = 1
+        f._kernel = identity + (self._kernel - identity) * factor ** 2
+        return f
+
     def _process(self, img):
-        img[:, :, 0] = convolve2d(img[:, :, 0], self._kernel, mode='same')
-        img[:, :, 1] = convolve2d(img[:, :, 1], self._kernel, mode='same')
-        img[:, :, 2] = convolve2d(img[:, :, 2], self._kernel, mode='same')
-        return img
+        return convolve(img, self._kernel)
 
 
 class GaussianBlur(BasicFilter):
@@ -413,10 +893,14 @@ class GaussianBlur(BasicFilter):
     def __init__(self, radius):
         self._sigma = radius / 3.0
 
-    def _process(self, img):
-        for c in xrange(3):
-            channel = img[:, :, c]
-            gaussian_filter(channel, output=channel, sigma=self._sigma)
-            img[:, :, c] = channel
+    def _halo(self):
+        # the same truncation as :func:`scipy.ndimage.gaussian_filter`
+        return int(4.0 * self._sigma + 0.5)
 
-        return img
+    def _rescaled(self, factor):
+        f = copy.copy(self)
+        f._sigma = self._sigma * factor
+        return f
+
+    def _process(self, img):
+        return gaussian(img, self._sigma)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# batch.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+import mmap
+import os
+import shutil
+import tempfile
+from multiprocessing import Pool
+
+import numpy as np
+
+from .arena import Arena, using
+
+__all__ = ('BatchRenderer',)
+
+# directory backed by shared memory, if any
+_SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# filters created in a worker process, keyed by name
+_filters = None
+
+# arena of scratch arrays kept by a worker process across renders
+_arena = None
+
+
+def _init_worker(factories, scratch_bytes):
+    global _filters, _arena
+    _filters = dict((name, factory())
+                    for name, factory in factories.iteritems())
+    if scratch_bytes:
+        _arena = Arena(scratch_bytes)
+
+
+def _render(task):
+    name, path, shape, dtype = task
+    mapped = np.memmap(path, dtype=dtype, mode='r+', shape=shape)
+    if _arena is None:
+        _filters[name](np.asarray(mapped))
+    else:
+        with using(_arena):
+            _filters[name](np.asarray(mapped))
+
+    mapped.flush()
+
+
+class BatchRenderer(object):
+    """Renders many images in a pool of worker processes.
+
+    Pixel data are moved between processes through files mapped in shared
+    memory (under ``/dev/shm`` if available), so images are never pickled.
+    Each worker creates its filters once and keeps them for its lifetime.
+
+    :param factories: a dict mapping names to picklable callables which create
+                      filters, such as preset classes. All presets in
+                      :mod:`imeffect.preset` are used by default.
+    :param processes: number of worker processes. The number of CPUs is used
+                      by default.
+    :param scratch_bytes: memory budget of the scratch arrays each worker keeps
+                          for reuse across renders (see
+                          :class:`Arena <imeffect.arena.Arena>`). Scratch
+                          arrays are not kept by default.
+    """
+
+    def __init__(self, factories=None, processes=None, scratch_bytes=None):
+        if factories is None:
+            from . import preset
+            factories = dict((name, getattr(preset, name))
+                             for name in preset.__all__)
+
+        self._dir = tempfile.mkdtemp(prefix='imeffect-', dir=_SHM_DIR)
+        self._count = 0
+        self._pool = Pool(processes, _init_worker, (factories, scratch_bytes))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def empty(self, shape, dtype=np.float32):
+        """Allocates an image in shared memory.
+
+        Images allocated by this method are rendered in place by
+        :meth:`render`, without being copied.
+
+        :param shape: shape of the image.
+        :param dtype: data type of the image.
+        """
+
+        self._count += 1
+        path = os.path.join(self._dir, '%d.img' % self._count)
+        return np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+
+    def render(self, name, imgs):
+        """Applies the filter of the given name to each of the images in the
+        worker processes.
+
+        :param name: name of the filter.
+        :param imgs: a list of images.
+        :return: a list of rendered images, which are backed by shared
+                 memory.
+        """
+
+        shared = []
+        for img in imgs:
+            if not self._owns(img):
+                copy = self.empty(img.shape, img.dtype)
+                copy[...] = img
+                img = copy
+
+            shared.append(img)
+
+        tasks = [(name, img.filename, img.shape, img.dtype.str)
+                 for img in shared]
+        try:
+            self._pool.map(_render, tasks)
+        finally:
+            # the mappings stay valid after their files are removed
+            for img in shared:
+                os.remove(img.filename)
+
+        return shared
+
+    def close(self):
+        """Stops the worker processes and releases the shared memory."""
+
+        self._pool.close()
+        self._pool.join()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def _owns(self, img):
+        # views of mapped images cannot be located by their files
+        if not isinstance(img, np.memmap) or \
+                not isinstance(img.base, mmap.mmap):
+            return False
+
+        filename = img.filename
+        return (filename is not None and
+                os.path.dirname(filename) == self._dir and
+                os.path.exists(filename))
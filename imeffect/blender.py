@@ -10,6 +10,8 @@
 
 import numpy as np
 
+from . import arena
+
 __all__ = ('normal',
            'multiply',
            'screen',
@@ -22,53 +24,127 @@ __all__ = ('normal',
            'darken')
 
 
-def normal(parent, layer):
-    return layer
+def _empty(parent, layer):
+    shape = np.broadcast(parent, layer).shape
+    return np.empty(shape, dtype=parent.dtype)
+
+
+def _scratch(parent):
+    """Returns a scratch array of the current arena, which has the same shape
+    and type as the parent layer.
+    """
+
+    return arena.empty(parent.shape, parent.dtype)
+
+
+def _mask(parent):
+    """Returns the mask of the values of the parent layer not above 0.5, in a
+    scratch array of the current arena.
+    """
+
+    return np.less_equal(parent, 0.5, out=arena.empty(parent.shape, np.bool_))
+
+
+def _times_inverse(out, parent):
+    """Multiplies the output by one minus the parent layer (in place), block
+    by block so that only small temporaries are allocated.
+    """
+    from .compiler import row_slices
+
+    for idx in row_slices(out.shape):
+        out[idx] *= 1 - parent[idx]
+
+
+def _merge(out, lower, parent):
+    """Copies the values of the given scratch array into the output where
+    the parent layer is not above 0.5, and releases the scratch array.
+    """
+
+    mask = _mask(parent)
+    np.copyto(out, lower, where=mask)
+    arena.release(mask)
+    arena.release(lower)
+    return out
+
+
+def normal(parent, layer, out=None):
+    if out is None:
+        return layer
+
+    if out is not layer:
+        np.copyto(out, layer)
+
+    return out
+
+
+def multiply(parent, layer, out=None):
+    return np.multiply(layer, parent, out=out)
+
+
+def screen(parent, layer, out=None):
+    if out is None:
+        out = _empty(parent, layer)
 
+    inverse = np.subtract(1, parent, out=_scratch(parent))
+    np.subtract(1, layer, out=out)
+    out *= inverse
+    arena.release(inverse)
+    return np.subtract(1, out, out=out)
 
-def multiply(parent, layer):
-    return layer * parent
 
+def overlay(parent, layer, out=None):
+    if out is None:
+        out = _empty(parent, layer)
 
-def screen(parent, layer):
-    return 1 - (1 - layer) * (1 - parent)
+    # the lower branch reads the layer, which may be the output buffer
+    lower = np.multiply(layer, parent, out=_scratch(parent))
+    lower *= 2
 
+    np.subtract(1, layer, out=out)
+    out *= 2
+    _times_inverse(out, parent)
+    np.subtract(1, out, out=out)
+    return _merge(out, lower, parent)
 
-def overlay(parent, layer):
-    gt_idx = parent > 0.5
-    lt_idx = ~gt_idx
 
-    result = np.zeros(parent.shape)
-    result[gt_idx] = 1 - 2 * (1 - layer[gt_idx]) * (1 - parent[gt_idx])
-    result[lt_idx] = layer[lt_idx] * parent[lt_idx] * 2
-    return result
+def difference(parent, layer, out=None):
+    return np.subtract(layer, parent, out=out)
 
 
-def difference(parent, layer):
-    return layer - parent
+def addition(parent, layer, out=None):
+    return np.add(layer, parent, out=out)
 
 
-def addition(parent, layer):
-    return layer + parent
+def exclusion(parent, layer, out=None):
+    if out is None:
+        out = _empty(parent, layer)
 
+    centered = np.subtract(parent, 0.5, out=_scratch(parent))
+    np.subtract(layer, 0.5, out=out)
+    out *= 2
+    out *= centered
+    arena.release(centered)
+    return np.subtract(0.5, out, out=out)
 
-def exclusion(parent, layer):
-    return 0.5 - 2 * (layer - 0.5) * (parent - 0.5)
 
+def softlight(parent, layer, out=None):
+    if out is None:
+        out = _empty(parent, layer)
 
-def softlight(parent, layer):
-    gt_idx = parent > 0.5
-    lt_idx = ~gt_idx
+    # the lower branch reads the layer, which may be the output buffer
+    lower = np.add(layer, 0.5, out=_scratch(parent))
+    lower *= parent
 
-    result = np.zeros(parent.shape)
-    result[gt_idx] = 1 - ((1 - (layer[gt_idx] - 0.5)) * (1 - parent[gt_idx]))
-    result[lt_idx] = (layer[lt_idx] + 0.5) * parent[lt_idx]
-    return result
+    np.subtract(layer, 0.5, out=out)
+    np.subtract(1, out, out=out)
+    _times_inverse(out, parent)
+    np.subtract(1, out, out=out)
+    return _merge(out, lower, parent)
 
 
-def lighten(parent, layer):
-    return np.maximum(parent, layer)
+def lighten(parent, layer, out=None):
+    return np.maximum(parent, layer, out=out)
 
 
-def darken(parent, layer):
-    return np.minimum(parent, layer)
+def darken(parent, layer, out=None):
+    return np.minimum(parent, layer, out=out)
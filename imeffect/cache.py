@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# cache.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+import threading
+from collections import OrderedDict
+
+__all__ = ('LRUCache',)
+
+
+def _nbytes(value):
+    if isinstance(value, tuple):
+        return sum(_nbytes(v) for v in value)
+
+    return value.nbytes
+
+
+class LRUCache(object):
+    """Thread-safe cache of arrays (or tuples of arrays), which discards the
+    least recently used entries once their total size exceeds the budget.
+
+    :param max_bytes: memory budget of the cache in bytes.
+    """
+
+    def __init__(self, max_bytes):
+        #: Memory budget of the cache in bytes.
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the entry of the given key, or ``None`` if absent."""
+
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+
+            return value
+
+    def put(self, key, value):
+        """Stores the entry of the given key.
+
+        :return: whether the entry has been stored, which is not the case if
+                 it alone exceeds the budget.
+        """
+
+        nbytes = _nbytes(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= _nbytes(old)
+
+            if nbytes > self.max_bytes:
+                return False
+
+            self._entries[key] = value
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._nbytes -= _nbytes(old)
+
+            return True
+
+    def clear(self):
+        """Discards all entries."""
+
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
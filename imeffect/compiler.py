@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# compiler.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+import copy
+
+import numpy as np
+
+from . import arena
+from .base import BasicFilter, FilterBase, LayeredFilter
+from .basic import Curves
+from .layer import FilterLayer, filter_as_layer
+
+__all__ = ('is_pointwise',
+           'is_channelwise',
+           'halo',
+           'reads_origin',
+           'FusedLayer',
+           'AffineFilter',
+           'fold_affine',
+           'compile_layers')
+
+#: Number of pixels processed at a time by :class:`FusedLayer`.
+#:
+#: A block of this size stays in cache while it passes through the whole run
+#: of fused layers.
+BLOCK_PIXELS = 1 << 15
+
+#: Largest amount by which the outputs of an affine filter may leave the range
+#: from 0 to 1 (due to rounding errors) and still be folded with the next one.
+AFFINE_TOLERANCE = 1e-9
+
+
+def row_slices(shape, pixels=BLOCK_PIXELS):
+    """Yields indices selecting consecutive rows of an image (or a stack of
+    images) of the given shape, each covering about the given number of
+    pixels.
+    """
+
+    h, w = shape[-3:-1]
+    rows = max(1, pixels // w)
+    for i in np.ndindex(shape[:-3]):
+        for start in xrange(0, h, rows):
+            yield i + (slice(start, start + rows),)
+
+
+def is_pointwise(obj):
+    """Checks whether the given filter or layer is point-wise, i.e. each
+    output pixel only depends on the same pixel of the input (and original)
+    image.
+    """
+
+    if isinstance(obj, BasicFilter):
+        return obj._POINTWISE
+    elif isinstance(obj, LayeredFilter):
+        return all(is_pointwise(l) for l in obj._layers)
+    elif isinstance(obj, FilterLayer):
+        return all(is_pointwise(f) for f in obj._filters)
+    elif isinstance(obj, FusedLayer):
+        return True
+
+    f = getattr(obj, 'filter', None)
+    return f is not None and is_pointwise(f)
+
+
+def is_channelwise(obj):
+    """Checks whether the given filter or layer is channel-wise, i.e. each
+    channel of an output pixel only depends on the same channel of the input
+    (and original) pixel.
+    """
+
+    if isinstance(obj, BasicFilter):
+        return obj._CHANNELWISE
+    elif isinstance(obj, (LayeredFilter, FusedLayer)):
+        return all(is_channelwise(l) for l in obj._layers)
+    elif isinstance(obj, FilterLayer):
+        return all(is_channelwise(f) for f in obj._filters)
+
+    f = getattr(obj, 'filter', None)
+    return f is not None and is_channelwise(f)
+
+
+def halo(obj):
+    """Returns how many pixels the given filter or layer reads beyond each
+    output pixel in every direction, or ``None`` if unknown.
+
+    Neighbourhood filters applied one after another add up their halos.
+    """
+
+    if isinstance(obj, BasicFilter):
+        return obj._halo()
+    elif isinstance(obj, (LayeredFilter, FusedLayer)):
+        children = obj._layers
+    elif isinstance(obj, FilterLayer):
+        children = obj._filters
+    else:
+        f = getattr(obj, 'filter', None)
+        return None if f is None else halo(f)
+
+    total = 0
+    for child in children:
+        child_halo = halo(child)
+        if child_halo is None:
+            return None
+
+        total += child_halo
+
+    return total
+
+
+def reads_origin(layer):
+    """Checks whether the given layer reads the original image passed to it.
+
+    Pseudo-layers wrapping filters and filter layers of constant colors never
+    do. Unknown layers are assumed to.
+    """
+
+    if isinstance(layer, FilterLayer):
+        return layer._constant_filters is None
+    elif isinstance(layer, FusedLayer):
+        return any(reads_origin(l) for l in layer._layers)
+
+    return getattr(layer, 'filter', None) is None
+
+
+class FusedLayer(object):
+    """Pseudo-layer which applies a run of point-wise layers to the image
+    block by block, instead of passing over the whole image once per layer.
+
+    :param layers: a list of point-wise layers.
+    :param block_pixels: number of pixels in each block.
+    """
+
+    def __init__(self, layers, block_pixels=BLOCK_PIXELS):
+        self._layers = tuple(layers)
+        self._block_pixels = block_pixels
+
+    def __call__(self, img, origin_img):
+        for idx in row_slices(img.shape, self._block_pixels):
+            block = img[idx]
+            origin_block = origin_img[idx]
+            for l in self._layers:
+                l(block, origin_block)
+
+        return img
+
+
+class AffineFilter(BasicFilter):
+    """Maps each pixel *x* to *A* *x* + *b* in a single pass.
+
+    :param matrix: a (3, 4) matrix [*A* | *b*].
+
+    .. seealso:: :func:`fold_affine`
+    """
+
+    _POINTWISE = True
+
+    def __init__(self, matrix):
+        self._matrix = np.asarray(matrix, dtype=np.float)
+        linear = self._matrix[:, :3]
+        self._CHANNELWISE = not np.any(linear - np.diag(np.diag(linear)))
+        self._matrices = {}
+
+    def _affine(self):
+        return self._matrix
+
+    def _process(self, img):
+        matrices = self._matrices.get(img.dtype)
+        if matrices is None:
+            matrix = self._matrix.astype(img.dtype)
+            matrices = (np.ascontiguousarray(matrix[:, :3].T), matrix[:, 3])
+            self._matrices[img.dtype] = matrices
+
+        linear, offset = matrices
+
+        # np.dot only uses BLAS for 2D arrays, so contiguous images are
+        # multiplied as a list of pixels
+        if img.flags.c_contiguous:
+            pixels = img.reshape((-1, 3))
+        else:
+            pixels = img
+
+        out = arena.empty(pixels.shape, img.dtype)
+        np.dot(pixels, linear, out=out)
+        np.add(out, offset, out=pixels)
+        arena.release(out)
+        return img
+
+
+def _affine_range(matrix):
+    """Returns the lower and upper bounds of each output channel of the given
+    affine map over inputs range from 0 to 1.
+    """
+
+    linear, offset = matrix[:, :3], matrix[:, 3]
+    lower = offset + np.minimum(linear, 0).sum(axis=1)
+    upper = offset + np.maximum(linear, 0).sum(axis=1)
+    return lower, upper
+
+
+def fold_affine(first, second):
+    """Folds two affine filters (see :meth:`BasicFilter._affine
+    <imeffect.base.BasicFilter._affine>`) applied one after another into a
+    single :class:`AffineFilter`.
+
+    Each filter clamps its outputs between 0 and 1, so both can only be
+    folded if the outputs of the first one never leave that range (for
+    inputs in that range). Otherwise, the clamp between them is kept.
+
+    :return: the folded filter, or ``None`` if they cannot be folded.
+    """
+
+    a = first._affine()
+    b = second._affine()
+    if a is None or b is None:
+        return None
+
+    lower, upper = _affine_range(a)
+    if lower.min() < -AFFINE_TOLERANCE or upper.max() > 1 + AFFINE_TOLERANCE:
+        return None
+
+    matrix = np.dot(b[:, :3], a)
+    matrix[:, 3] += b[:, 3]
+    return AffineFilter(matrix)
+
+
+def _merge(first, second):
+    """Returns a single filter equivalent to applying the given filters one
+    after another, or ``None`` if they cannot be merged.
+    """
+
+    if isinstance(first, Curves) and isinstance(second, Curves):
+        # only level tables compose exactly
+        if first._resolution is None and second._resolution is None:
+            return first.compose(second)
+
+        return None
+
+    return fold_affine(first, second)
+
+
+def _merge_filters(layers):
+    """Merges consecutive pseudo-layers of :class:`Curves
+    <imeffect.basic.Curves>` filters (including :class:`Exposure
+    <imeffect.basic.Exposure>`) into one, and folds consecutive affine
+    filters (see :func:`fold_affine`).
+    """
+
+    result = []
+    for l in layers:
+        f = getattr(l, 'filter', None)
+        last = getattr(result[-1], 'filter', None) if result else None
+        merged = None
+        if isinstance(f, BasicFilter) and isinstance(last, BasicFilter):
+            merged = _merge(last, f)
+
+        if merged is not None:
+            result[-1] = filter_as_layer(merged)
+        else:
+            result.append(l)
+
+    return result
+
+
+def _unclamped_layer(f):
+    """Wraps the given filter as a pseudo-layer which does not clamp its
+    outputs.
+    """
+
+    def wrapper(img, origin_img):
+        return f._process(img)
+
+    wrapper.filter = f
+    return wrapper
+
+
+def _is_bounded(layer):
+    """Checks whether the outputs of the given layer are known to be between 0
+    and 1.
+    """
+
+    return (isinstance(layer, (FilterLayer, FusedLayer)) or
+            isinstance(getattr(layer, 'filter', None), FilterBase))
+
+
+def _skip_clamps(layers):
+    """Replaces pseudo-layers of filters which keep inputs between 0 and 1
+    within that range with ones which do not clamp their outputs.
+
+    The first layer is left untouched, since its inputs are not known to be
+    in range.
+    """
+
+    result = []
+    for l in layers:
+        f = getattr(l, 'filter', None)
+        if result and _is_bounded(result[-1]) and \
+                isinstance(f, BasicFilter):
+            bounds = f._range(0.0, 1.0)
+            if bounds is not None and bounds[0] >= 0 and bounds[1] <= 1:
+                l = _unclamped_layer(f)
+
+        result.append(l)
+
+    return result
+
+
+def _compile_filter_layer(layer):
+    if is_pointwise(layer):
+        filters = tuple(_skip_clamps(_merge_filters(layer._filters)))
+    else:
+        filters = compile_layers(layer._filters)
+
+    if filters == tuple(layer._filters):
+        return layer
+
+    layer = copy.copy(layer)
+    layer._filters = filters
+    return layer
+
+
+def compile_layers(layers):
+    """Merges consecutive :class:`Curves <imeffect.basic.Curves>` filters into
+    one and folds consecutive affine filters (see :func:`fold_affine`), and
+    then replaces each run of consecutive point-wise layers with a single
+    :class:`FusedLayer`.
+
+    Filters which provably keep their outputs between 0 and 1 (see
+    :meth:`BasicFilter._range <imeffect.base.BasicFilter._range>`) are not
+    clamped, unless they are applied first. Folded filters may differ from
+    the original ones by rounding errors.
+
+    The given layers are left untouched. Nested filter layers are compiled as
+    well.
+
+    :param layers: a list of layers.
+    :return: a tuple of compiled layers.
+    """
+
+    result = []
+    run = []
+    for l in _skip_clamps(_merge_filters(layers)):
+        if isinstance(l, FilterLayer):
+            l = _compile_filter_layer(l)
+
+        if is_pointwise(l):
+            run.append(l)
+            continue
+
+        _flush(run, result)
+        result.append(l)
+
+    _flush(run, result)
+    return tuple(result)
+
+
+def _flush(run, result):
+    if len(run) > 1:
+        result.append(FusedLayer(run))
+    else:
+        result.extend(run)
+
+    del run[:]
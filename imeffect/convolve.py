@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# convolve.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+import numpy as np
+from scipy.ndimage import convolve1d, gaussian_filter
+from scipy.signal import fftconvolve
+
+__all__ = ('convolve',
+           'gaussian')
+
+#: Rank-one kernels with more than this many taps are applied as two 1D
+#: passes.
+SEPARABLE_MIN_TAPS = 9
+
+#: Other kernels with at most this many non-zero taps are applied directly.
+DIRECT_MAX_TAPS = 25
+
+#: Gaussian kernels with at least this radius are applied with FFT.
+FFT_MIN_RADIUS = 128
+
+
+def _spatial_shape(img, kernel):
+    """Reshapes the 2D kernel so that it broadcasts against the spatial axes
+    of an image (or a stack of images).
+    """
+    return kernel.reshape((1,) * (img.ndim - 3) + kernel.shape + (1,))
+
+
+def _convolve_direct(img, kernel):
+    h, w = img.shape[-3:-1]
+    kh, kw = kernel.shape
+    out = np.zeros_like(img)
+    tmp = np.empty_like(img)
+    for i in xrange(kh):
+        for j in xrange(kw):
+            k = kernel[i, j]
+            if k == 0:
+                continue
+
+            # out[y, x] += k * img[y + dy, x + dx]
+            dy = kh // 2 - i
+            dx = kw // 2 - j
+            src = (Ellipsis,
+                   slice(max(dy, 0), h + min(dy, 0)),
+                   slice(max(dx, 0), w + min(dx, 0)),
+                   slice(None))
+            dst = (Ellipsis,
+                   slice(max(-dy, 0), h + min(-dy, 0)),
+                   slice(max(-dx, 0), w + min(-dx, 0)),
+                   slice(None))
+            part = tmp[dst]
+            np.multiply(img[src], k, out=part)
+            out[dst] += part
+
+    img[...] = out
+    return img
+
+
+def _separate(kernel):
+    """Splits the kernel into a column and a row vector if it has rank one."""
+
+    u, s, v = np.linalg.svd(kernel)
+    if s.size > 1 and s[1] > s[0] * 1e-12:
+        return None
+
+    scale = np.sqrt(s[0])
+    return u[:, 0] * scale, v[0] * scale
+
+
+def convolve(img, kernel, method=None):
+    """Convolves all channels of the image (or a stack of images) with the
+    given 2D kernel (in place), treating pixels outside the image as zeros.
+
+    Rank-one kernels are applied as two 1D passes, other small kernels
+    directly, and other large kernels with FFT.
+
+    :param img: the image.
+    :param kernel: a 2D kernel of odd width and height.
+    :param method: ``'direct'``, ``'separable'``, ``'fft'`` or ``None`` to
+                   select automatically.
+    """
+
+    kernel = np.asarray(kernel, dtype=img.dtype)
+    if kernel.ndim != 2 or not all(n % 2 for n in kernel.shape):
+        raise ValueError('expected a 2D kernel of odd width and height')
+
+    vectors = _separate(kernel)
+    if method is None:
+        if vectors is not None and kernel.size > SEPARABLE_MIN_TAPS:
+            method = 'separable'
+        elif np.count_nonzero(kernel) <= DIRECT_MAX_TAPS:
+            method = 'direct'
+        else:
+            method = 'fft'
+
+    if method == 'direct':
+        return _convolve_direct(img, kernel)
+    elif method == 'separable':
+        if vectors is None:
+            raise ValueError('the kernel is not separable')
+
+        col, row = vectors
+        convolve1d(img, col, axis=-3, output=img, mode='constant')
+        convolve1d(img, row, axis=-2, output=img, mode='constant')
+        return img
+    elif method == 'fft':
+        kernel = _spatial_shape(img, kernel)
+        axes = (img.ndim - 3, img.ndim - 2)
+        img[...] = fftconvolve(img, kernel, mode='same', axes=axes)
+        return img
+
+    raise ValueError('unknown method: {}'.format(method))
+
+
+def _gaussian_kernel(sigma, radius):
+    x = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 / (sigma * sigma) * x ** 2)
+    return kernel / kernel.sum()
+
+
+def _gaussian_fft(img, sigma, radius):
+    kernel = _gaussian_kernel(sigma, radius).astype(img.dtype)
+    for axis in (img.ndim - 3, img.ndim - 2):
+        pad = [(0, 0)] * img.ndim
+        pad[axis] = (radius, radius)
+        padded = np.pad(img, pad, mode='symmetric')
+
+        shape = [1] * img.ndim
+        shape[axis] = kernel.size
+        img[...] = fftconvolve(padded, kernel.reshape(shape), mode='valid',
+                               axes=axis)
+
+    return img
+
+
+def gaussian(img, sigma, method=None):
+    """Blurs all channels of the image (or a stack of images) with a Gaussian
+    kernel (in place), reflecting the image at its borders like
+    :func:`scipy.ndimage.gaussian_filter`.
+
+    Kernels are applied as two 1D passes, either directly or with FFT for
+    large radii.
+
+    :param img: the image.
+    :param sigma: standard deviation of the Gaussian kernel.
+    :param method: ``'direct'``, ``'fft'`` or ``None`` to select
+                   automatically.
+    """
+
+    # the same truncation as scipy.ndimage.gaussian_filter
+    radius = int(4.0 * sigma + 0.5)
+    if method is None:
+        method = 'fft' if radius >= FFT_MIN_RADIUS else 'direct'
+
+    if method == 'direct':
+        sigmas = (0,) * (img.ndim - 3) + (sigma, sigma, 0)
+        gaussian_filter(img, sigmas, output=img)
+        return img
+    elif method == 'fft':
+        return _gaussian_fft(img, sigma, radius)
+
+    raise ValueError('unknown method: {}'.format(method))
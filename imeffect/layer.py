@@ -8,36 +8,93 @@
 # Distributed under The BSD 3-Clause License
 #################################################
 
+import copy
+import inspect
+
 import numpy as np
 
+from . import arena
+from .base import BasicFilter
+
 __all__ = ('filter_as_layer',
            'FilterLayer')
 
 
 def filter_as_layer(f):
-    """Wraps the given filter as a pseudo-layer."""
+    """Wraps the given filter as a pseudo-layer.
+
+    The wrapped filter is available as the ``filter`` attribute of the
+    returned pseudo-layer.
+    """
 
     def wrapper(img, origin_img):
         return f(img)
 
+    wrapper.filter = f
     return wrapper
 
 
+def _constant_filters(filters):
+    """Returns the trailing filters producing the content of a layer from a
+    filter with constant output, or ``None`` if the content is not constant.
+    """
+
+    for i in xrange(len(filters) - 1, -1, -1):
+        f = getattr(filters[i], 'filter', None)
+        if not isinstance(f, BasicFilter) or not f._POINTWISE:
+            return None
+
+        if f._constant() is not None:
+            return [l.filter for l in filters[i:]]
+
+    return None
+
+
+def _accepts_out(blender):
+    """Checks whether the given blender accepts an ``out`` argument."""
+
+    if isinstance(blender, np.ufunc):
+        return True
+
+    try:
+        spec = inspect.getargspec(blender)
+    except TypeError:  # not a Python function
+        return False
+
+    return 'out' in spec.args or spec.keywords is not None
+
+
 class FilterLayer(object):
     """Filter layer which can apply some filter effects to the given image,
     and then blended back into the parent layer.
 
     :param opacity: opacity of this layer.
-    :param blender: blender function.
+    :param blender: blender function, which is called as
+                    ``blender(parent, layer)``. Blenders accepting an ``out``
+                    argument are called as ``blender(parent, layer,
+                    out=layer)`` instead, and may write the result into the
+                    buffer of the layer.
     :param filters: a list of filters to be applied to the image.
 
+    If the filters produce a constant color (e.g. they end with
+    :class:`FillColor <imeffect.basic.FillColor>` followed by point-wise
+    filters only), the color is computed once and blended against the parent
+    layer by broadcasting, without copying the original image.
+
+    The copy of the layer is drawn from the current
+    :class:`Arena <imeffect.arena.Arena>`, so that successive layers reuse
+    the same buffer.
+
     .. seealso:: :ref:`blenders`
     """
 
     def __init__(self, opacity, blender, filters):
         self._opacity = opacity * 0.01
         self._blender = blender
+        self._blender_out = _accepts_out(blender)
         self._filters = filters
+        self._constant_filters = _constant_filters(filters)
+        self._colors = {}
 
     def __call__(self, parent, img):
         """Applies filter effects to the original image and blends it back to
@@ -46,12 +103,56 @@ class FilterLayer(object):
         :param parent: the parent layer.
         :param img: the original image.
         """
-        layer = np.copy(img)
-        for f in self._filters:
-            f(layer, img)
-
-        result = self._blender(parent, layer)
-        parent -= (parent - result) * self._opacity
-        parent[parent > 1] = 1
-        parent[parent < 0] = 0
+        if self._constant_filters is not None:
+            color = self._color(parent.dtype)
+            layer = arena.empty(parent.shape, parent.dtype)
+            result = self._blend(parent, color, layer)
+        else:
+            layer = arena.empty(img.shape, img.dtype)
+            layer[...] = img
+            for f in self._filters:
+                f(layer, img)
+
+            result = self._blend(parent, layer, layer)
+
+        result -= parent
+        result *= self._opacity
+        parent += result
+        np.clip(parent, 0, 1, out=parent)
+        arena.release(layer)
         return parent
+
+    def _blend(self, parent, layer, out):
+        if self._blender_out:
+            return self._blender(parent, layer, out=out)
+
+        out[...] = self._blender(parent, layer)
+        return out
+
+    def _color(self, dtype):
+        color = self._colors.get(dtype)
+        if color is None:
+            color = np.zeros((1, 1, 3), dtype=dtype)
+            for f in self._constant_filters:
+                color = f(color)
+
+            self._colors[dtype] = color
+
+        return color
+
+    def _rescaled(self, factor):
+        """Returns a layer equivalent to this one for an image scaled by the
+        given factor.
+
+        .. seealso:: :func:`rescale_layers
+                     <imeffect.resample.rescale_layers>`
+        """
+        from .resample import rescale_layers
+
+        filters = rescale_layers(self._filters, factor)
+        if all(f is g for f, g in zip(filters, self._filters)):
+            return self
+
+        layer = copy.copy(self)
+        layer._filters = filters
+        return layer
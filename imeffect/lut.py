@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# lut.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+import weakref
+
+import numpy as np
+
+from .base import BasicFilter, LayeredFilter
+from .compiler import (halo, is_channelwise, is_pointwise, reads_origin,
+                       row_slices)
+from .tile import apply_tiled
+
+__all__ = ('LUT1D',
+           'LUT3D',
+           'bake',
+           'process_integer')
+
+#: Default number of entries of baked per-channel tables.
+#:
+#: With 256 entries, the lattice points are exactly the 8-bit levels, so baked
+#: tables reproduce the original filter on images decoded from 8-bit data.
+LUT1D_SIZE = 256
+
+#: Default number of lattice points along each axis of baked color cubes.
+LUT3D_SIZE = 33
+
+# lookup tables baked for integer images, keyed by filter and image type
+_integer_luts = weakref.WeakKeyDictionary()
+
+
+def _blocks(img):
+    """Yields views of consecutive rows of the given image, each holding about
+    :data:`BLOCK_PIXELS <imeffect.compiler.BLOCK_PIXELS>` pixels.
+    """
+
+    for idx in row_slices(img.shape):
+        yield img[idx]
+
+
+def _process_as_float(f, img):
+    """Applies the given point-wise filter to an integer image block by
+    block, converting each block to floating-point values.
+    """
+
+    levels = np.iinfo(img.dtype).max
+    for block in _blocks(img):
+        work = block.astype(f._FLOAT_DTYPE)
+        work /= levels
+        work = f(work)
+        work *= levels
+        block[...] = np.rint(work, out=work)
+
+    return img
+
+
+def _locate(values, n):
+    """Splits the given values (range from 0 to 1) into indices of the lower
+    lattice points and the interpolation weights of the upper ones.
+    """
+
+    x = values * n
+    np.clip(x, 0, n, out=x)
+    idx = x.astype(np.intp)
+    np.minimum(idx, n - 1, out=idx)
+    x -= idx
+    return idx, x
+
+
+class LUT1D(BasicFilter):
+    """Maps each channel through its own lookup table, linearly interpolating
+    between adjacent entries.
+
+    :param table: an (*N*, 3) array. The *i*-th row holds the outputs of the
+                  three channels for the input value *i* / (*N* - 1).
+    """
+
+    _POINTWISE = True
+    _CHANNELWISE = True
+
+    def __init__(self, table):
+        table = np.asarray(table, dtype=np.float)
+        self._size = table.shape[0]
+        self._table = table.ravel()
+        self._slope = np.diff(table, axis=0).ravel()
+        self._integer_tables = {}
+
+    def _process(self, img):
+        idx, frac = _locate(img, self._size - 1)
+        idx *= 3
+        idx += np.arange(3)
+        frac *= self._slope.astype(img.dtype, copy=False).take(idx)
+        frac += self._table.astype(img.dtype, copy=False).take(idx)
+        img[...] = frac
+        return img
+
+    def _process_integer(self, img):
+        levels = np.iinfo(img.dtype).max
+        if self._size != levels + 1:
+            return _process_as_float(self, img)
+
+        table = self._integer_tables.get(img.dtype)
+        if table is None:
+            table = np.rint(np.clip(self._table, 0, 1) * levels)
+            table = self._integer_tables[img.dtype] = table.astype(img.dtype)
+
+        for block in _blocks(img):
+            idx = block.reshape((-1, 3)).astype(np.intp)
+            idx *= 3
+            idx += np.arange(3)
+            block[...] = table.take(idx).reshape(block.shape)
+
+        return img
+
+
+class LUT3D(BasicFilter):
+    """Maps colors through a color cube with trilinear interpolation.
+
+    :param table: an (*N*, *N*, *N*, 3) array. The entry at (*i*, *j*, *k*)
+                  holds the output color for the input color
+                  (*i*, *j*, *k*) / (*N* - 1).
+    """
+
+    _POINTWISE = True
+
+    def __init__(self, table):
+        table = np.asarray(table, dtype=np.float)
+        self._size = table.shape[0]
+        self._table = table.reshape((-1, 3))
+
+    def _process(self, img):
+        table = self._table.astype(img.dtype, copy=False)
+        for block in _blocks(img):
+            colors = self._lookup(table, block.reshape((-1, 3)))
+            block[...] = colors.reshape(block.shape)
+
+        return img
+
+    def _process_integer(self, img):
+        return _process_as_float(self, img)
+
+    def _lookup(self, table, colors):
+        n = self._size
+        idx, frac = _locate(colors, n - 1)
+        base = (idx[:, 0] * n + idx[:, 1]) * n + idx[:, 2]
+
+        result = np.zeros(colors.shape, dtype=colors.dtype)
+        for dr in (0, 1):
+            wr = frac[:, 0] if dr else 1 - frac[:, 0]
+            for dg in (0, 1):
+                wrg = wr * (frac[:, 1] if dg else 1 - frac[:, 1])
+                for db in (0, 1):
+                    weight = wrg * (frac[:, 2] if db else 1 - frac[:, 2])
+                    corner = base + (dr * n + dg) * n + db
+                    result += table.take(corner, axis=0) * \
+                        weight[:, np.newaxis]
+
+        return result
+
+
+def bake(f, size=None):
+    """Evaluates the given point-wise filter once on a lattice of colors and
+    returns an equivalent lookup-table filter.
+
+    Channel-wise filters are baked into a :class:`LUT1D` (256 entries by
+    default), others into a :class:`LUT3D` (33x33x33 lattice points by
+    default).
+
+    :param f: a point-wise filter.
+    :param size: number of lattice points along each axis.
+    """
+
+    if not is_pointwise(f):
+        raise ValueError('only point-wise filters can be baked')
+
+    if is_channelwise(f):
+        size = size or LUT1D_SIZE
+        grid = np.arange(size) / (size - 1.0)
+        lattice = np.repeat(grid, 3).reshape((size, 1, 3))
+        return LUT1D(f(lattice).reshape((size, 3)))
+
+    size = size or LUT3D_SIZE
+    grid = np.arange(size) / (size - 1.0)
+    lattice = np.stack(np.meshgrid(grid, grid, grid, indexing='ij'), axis=-1)
+    lattice = lattice.reshape((size * size, size, 3))
+    return LUT3D(f(lattice).reshape((size, size, size, 3)))
+
+
+def _level_table(layers, dtype, float_dtype):
+    """Applies the given channel-wise layers to every level of the given
+    integer type, and returns the results as a flattened (*levels*, 3) table
+    of floating-point values.
+    """
+
+    levels = np.iinfo(dtype).max
+    lattice = np.arange(levels + 1, dtype=float_dtype)
+    lattice /= levels
+    lattice = np.repeat(lattice, 3).reshape((levels + 1, 1, 3))
+    origin = lattice.copy()
+    for l in layers:
+        l(lattice, origin)
+
+    return lattice.ravel()
+
+
+def _process_split(f, img, table, layers):
+    """Applies the given point-wise layered filter to an integer image block
+    by block, looking up the results of its leading channel-wise layers in
+    the given level table and applying the remaining layers to them.
+    """
+
+    levels = np.iinfo(img.dtype).max
+    origin = any(reads_origin(l) for l in layers)
+    for block in _blocks(img):
+        idx = block.reshape((-1, 3)).astype(np.intp)
+        idx *= 3
+        idx += np.arange(3)
+        work = table.take(idx).reshape(block.shape)
+        if origin:
+            origin_block = block.astype(f._FLOAT_DTYPE)
+            origin_block /= levels
+        else:
+            origin_block = work
+
+        for l in layers:
+            l(work, origin_block)
+
+        work *= levels
+        block[...] = np.rint(work, out=work)
+
+    return img
+
+
+def _float_strips(f, dtype):
+    """Wraps the given filter as a filter applying it to a floating-point
+    copy of each integer strip passed by :func:`apply_tiled
+    <imeffect.tile.apply_tiled>`.
+    """
+
+    levels = np.iinfo(dtype).max
+
+    def wrapper(tile):
+        work = tile.astype(f._FLOAT_DTYPE)
+        work /= levels
+        work = f(work)
+        work *= levels
+        return np.rint(work, out=work)
+
+    # keep the halo of the filter visible to apply_tiled
+    wrapper.filter = f
+    return wrapper
+
+
+def process_integer(f, img):
+    """Applies the given filter to an image of unsigned integer type (in
+    place).
+
+    Channel-wise filters are baked into a :class:`LUT1D` at every level of
+    the image type once per image type, so no interpolation is involved and
+    the image is not converted to floating-point values. Point-wise layered
+    filters starting with channel-wise layers look up the results of those
+    layers at every level in a table, and apply the remaining layers block by
+    block. Other point-wise filters are applied block by block to
+    floating-point copies of the blocks. Other filters declaring their halos
+    are applied strip by strip (see :func:`apply_tiled
+    <imeffect.tile.apply_tiled>`) to floating-point copies of the strips, so
+    that only one strip is converted at a time; filters drawing random
+    numbers (such as :class:`Noise <imeffect.basic.Noise>` without a noise
+    texture) then draw different ones than on the whole image. Otherwise, the
+    filter is applied to a floating-point copy of the whole image.
+
+    Floating-point values are in the type given by the ``_FLOAT_DTYPE``
+    attribute of the filter and rounded back to the original type, so the
+    result is the same as applying the filter to the image converted to that
+    type (up to one level where values are rounded halfway between levels).
+    Unlike :func:`bake`, colors are never interpolated from a color cube.
+
+    :param f: a filter.
+    :param img: an image of unsigned integer type.
+    """
+
+    if not is_pointwise(f):
+        if img.ndim == 3 and halo(f) is not None:
+            return apply_tiled(_float_strips(f, img.dtype), img)
+
+        levels = np.iinfo(img.dtype).max
+        work = img.astype(f._FLOAT_DTYPE)
+        work /= levels
+        work = f(work)
+        work *= levels
+        img[...] = np.rint(work, out=work)
+        return img
+
+    luts = _integer_luts.setdefault(f, {})
+    lut = luts.get(img.dtype)
+    if lut is None:
+        if is_channelwise(f):
+            lut = bake(f, np.iinfo(img.dtype).max + 1)
+        elif isinstance(f, LayeredFilter):
+            layers = f._layers
+            k = 0
+            while is_channelwise(layers[k]):
+                k += 1
+
+            table = None
+            if k:
+                table = _level_table(layers[:k], img.dtype, f._FLOAT_DTYPE)
+
+            lut = (table, layers[k:])
+        else:
+            lut = (None, None)
+
+        luts[img.dtype] = lut
+
+    if isinstance(lut, LUT1D):
+        return lut(img)
+
+    table, layers = lut
+    if table is None:
+        return _process_as_float(f, img)
+
+    return _process_split(f, img, table, layers)
@@ -10,6 +10,8 @@
 
 from itertools import chain
 
+from .layer import filter_as_layer
+
 __all__ = ('FilterPool',)
 
 
@@ -45,8 +47,4 @@ class FilterPool(object):
         """
 
         f = self.register(cls, *args, **kwargs)
-
-        def wrapper(img, origin_img):
-            return f(img)
-
-        return wrapper
+        return filter_as_layer(f)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# render.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+import threading
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from .arena import Arena, current_arena, using
+from .compiler import reads_origin
+from .resample import rescale_layers, resize, scale_factor
+
+__all__ = ('render_many',
+           'render_async',
+           'render_resized')
+
+# background thread of render_async, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class _Node(object):
+    """Node of a trie of layer sequences. Each node stands for the image
+    obtained by applying the layers along the path from the root.
+    """
+
+    def __init__(self):
+        # children keyed by layer keys, as (layer, node) tuples
+        self.children = {}
+
+        # names of the filters whose outputs are the image of this node
+        self.names = []
+
+
+def _layer_key(layer):
+    """Returns a key which is equal for layers doing the same computation.
+
+    Pseudo-layers created from the same filter instance (e.g. by
+    :class:`FilterPool <imeffect.pool.FilterPool>`) share their keys. Other
+    layers are only equal to themselves.
+    """
+
+    f = getattr(layer, 'filter', None)
+    if f is None:
+        return id(layer)
+
+    return (getattr(layer, '__code__', type(layer)), id(f))
+
+
+def _build(filters):
+    root = _Node()
+    for name, f in filters.iteritems():
+        node = root
+        for l in f._layers:
+            key = _layer_key(l)
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = (l, _Node())
+
+            node = child[1]
+
+        node.names.append(name)
+
+    return root
+
+
+def _walk(node, img, origin_img, outputs):
+    """Applies the layers below the given node to the image, which is owned
+    by the node. The last consumer of the image takes it over instead of
+    copying it.
+    """
+
+    consumers = len(node.names) + len(node.children)
+    for name in node.names:
+        consumers -= 1
+        outputs[name] = img if consumers == 0 else img.copy()
+
+    for layer, child in node.children.itervalues():
+        consumers -= 1
+        state = img if consumers == 0 else img.copy()
+        layer(state, origin_img)
+        _walk(child, state, origin_img, outputs)
+
+
+def render_many(img, filters=None):
+    """Applies many layered filters to the same image, evaluating the layers
+    they share at the beginning only once.
+
+    Filters share a layer if it is the same object, or a pseudo-layer of the
+    same filter instance. For example, presets built with
+    :class:`FilterPool <imeffect.pool.FilterPool>` share their leading
+    ``Greyscale`` and ``Contrast`` stages. Shared stages which draw random
+    numbers (such as :class:`Noise <imeffect.basic.Noise>`) are drawn once
+    for all filters sharing them.
+
+    :param img: the image, which is left untouched.
+    :param filters: a dict mapping names to
+                    :class:`LayeredFilter <imeffect.base.LayeredFilter>`
+                    instances. All presets in :mod:`imeffect.preset` are used
+                    by default.
+    :return: a dict mapping names to rendered images.
+    """
+
+    if filters is None:
+        from . import preset
+        filters = dict((name, getattr(preset, name)())
+                       for name in preset.__all__)
+
+    # integer images are mapped through lookup tables baked per filter
+    if img.dtype.kind == 'u':
+        return dict((name, f(img.copy())) for name, f in filters.iteritems())
+
+    outputs = {}
+    root = _build(filters)
+    if current_arena() is None:
+        with using(Arena()):
+            _walk(root, img.copy(), img, outputs)
+    else:
+        _walk(root, img.copy(), img, outputs)
+
+    return outputs
+
+
+def render_async(f, img):
+    """Applies the filter to a copy of the image in a background thread.
+
+    Renders are run one at a time, in the order they are requested. Most of
+    the work is done by NumPy routines which release the GIL, so the calling
+    thread (e.g. of a user interface) stays responsive.
+
+    :param f: the filter.
+    :param img: the image, which is left untouched.
+    :return: a :class:`multiprocessing.pool.AsyncResult`, whose ``get()``
+             method returns the filtered image.
+    """
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPool(1)
+
+    return _pool.apply_async(f, (img.copy(),))
+
+
+def _render_resized(layers, img, shape, stage, dtype):
+    head = layers[:stage]
+    tail = rescale_layers(layers[stage:], scale_factor(img.shape[-3:-1], shape))
+
+    if head:
+        result = img.copy()
+        for l in head:
+            l(result, img)
+
+        result = resize(result, shape)
+    else:
+        result = resize(img, shape, dtype)
+
+    origin_img = result
+    if any(reads_origin(l) for l in tail):
+        origin_img = resize(img, shape, dtype) if head else result.copy()
+
+    for l in tail:
+        l(result, origin_img)
+
+    return result
+
+
+def render_resized(f, img, shape, stage=None):
+    """Applies the layered filter to the image and resizes the result to the
+    given size, running the layers after the given stage at the output size.
+
+    The image is box-resampled (see :func:`resize
+    <imeffect.resample.resize>`) after the given number of layers, and the
+    remaining layers are rescaled to the output size (see
+    :func:`rescale_layers <imeffect.resample.rescale_layers>`). Layers which
+    read the original image get it resampled as well.
+
+    By default, the image is resampled before all layers when shrinking, and
+    after them when enlarging, so that every layer runs at the smaller size.
+    Point-wise layers commute with resampling except where they are not
+    linear, and rescaled neighbourhood layers approximate the full-size ones.
+    Shrinking a photo by 4 to 8 times, the outputs of the presets differ
+    from filtering then resizing by less than 0.01 on average and by less
+    than 0.09 for 99% of the pixels, on a scale of 0 to 1. The exceptions are
+    ``Lomo``, ``SinCity`` and ``Grungy`` (whose noise is drawn anew), which
+    differ by up to 0.035 on average and 0.21 for 99% of the pixels. Single
+    pixels on sharp edges through strongly nonlinear layers (such as high
+    contrast) may differ by up to about 0.45. Running more leading layers at
+    the size of the image (see ``stage``) trades speed for accuracy.
+
+    :param f: a :class:`LayeredFilter <imeffect.base.LayeredFilter>`.
+    :param img: the image, which is left untouched.
+    :param shape: (*height*, *width*) of the output image.
+    :param stage: number of leading layers run at the size of the image.
+    :return: a new image of the same type as the given one.
+    """
+
+    layers = f._layers
+    if stage is None:
+        h, w = img.shape[-3:-1]
+        stage = 0 if shape[0] * shape[1] <= h * w else len(layers)
+
+    # integer images are resampled straight into floating-point values,
+    # unless some layers run at the size of the image
+    dtype = img.dtype
+    float_dtype = dtype
+    if dtype.kind == 'u':
+        float_dtype = np.dtype(f._FLOAT_DTYPE)
+        if stage:
+            img = img.astype(float_dtype)
+            img /= np.iinfo(dtype).max
+
+    if current_arena() is None:
+        with using(Arena()):
+            result = _render_resized(layers, img, shape, stage, float_dtype)
+    else:
+        result = _render_resized(layers, img, shape, stage, float_dtype)
+
+    if dtype.kind == 'u':
+        result *= np.iinfo(dtype).max
+        np.rint(result, out=result)
+        return result.astype(dtype)
+
+    return result
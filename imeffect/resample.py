@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# resample.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+import numpy as np
+
+__all__ = ('resize',
+           'scale_factor',
+           'rescale_layers')
+
+
+#: Number of rows (or columns) of integer images converted to floating-point
+#: values at once while resampling.
+BLOCK_ROWS = 64
+
+
+def _resample_axis(img, n, axis, dtype):
+    """Resamples the image to the given number of pixels along the given
+    axis, averaging the source pixels covered by each output pixel in the
+    given floating-point type.
+
+    Images of other types are resampled block by block along the other image
+    axis, since NumPy converts the whole input of a reduction at once.
+    """
+
+    m = img.shape[axis]
+    if n == m:
+        return img
+
+    if img.dtype == dtype:
+        return _resample_block(img, n, axis)
+
+    shape = list(img.shape)
+    shape[axis] = n
+    result = np.empty(shape, dtype=dtype)
+
+    # split rows when resampling columns, and columns otherwise
+    k = img.ndim - 3 if axis == img.ndim - 2 else img.ndim - 2
+    idx = [slice(None)] * img.ndim
+    for start in xrange(0, img.shape[k], BLOCK_ROWS):
+        idx[k] = slice(start, start + BLOCK_ROWS)
+        result[tuple(idx)] = _resample_block(img[tuple(idx)], n, axis, dtype)
+
+    return result
+
+
+def _resample_block(img, n, axis, dtype=None):
+    m = img.shape[axis]
+    dtype = dtype or img.dtype
+    step = float(m) / n
+    edges = np.arange(n + 1) * step
+    edges[-1] = m
+    lower = np.floor(edges).astype(np.intp)
+    frac = (edges - lower).astype(dtype)
+
+    shape = [1] * img.ndim
+    shape[axis] = n
+
+    # sums of the whole source pixels covered by each output pixel; reduceat
+    # yields a single pixel instead of nothing for empty ranges
+    result = np.add.reduceat(img, lower[:-1], axis=axis, dtype=dtype)
+    result *= (lower[:-1] < lower[1:]).reshape(shape)
+
+    # add the partially covered pixels at both ends
+    idx = np.minimum(lower, m - 1)
+    result += np.take(img, idx[1:], axis=axis) * frac[1:].reshape(shape)
+    result -= np.take(img, idx[:-1], axis=axis) * frac[:-1].reshape(shape)
+    result /= step
+    return result
+
+
+def resize(img, shape, dtype=None):
+    """Resizes the image (or a stack of images) with box resampling, i.e.
+    each output pixel is the average of the area of the image it covers.
+
+    The image is passed over once along each axis, so that downscaling large
+    images is cheap. Images of integer types are resampled without being
+    converted to floating-point values as a whole.
+
+    :param img: the image.
+    :param shape: (*height*, *width*) of the output image.
+    :param dtype: floating-point type of the output image, in which integer
+                  images are scaled to values between 0 and 1. By default,
+                  the output image has the same type as the given one.
+    :return: a new image.
+    """
+
+    src_dtype = img.dtype
+    if dtype is not None:
+        work_dtype = np.dtype(dtype)
+    elif src_dtype.kind == 'u':
+        work_dtype = np.dtype(np.float64)
+    else:
+        work_dtype = src_dtype
+
+    # resample along rows first, since reducing along the outer axis is much
+    # slower for the same number of pixels
+    result = _resample_axis(img, shape[1], img.ndim - 2, work_dtype)
+    result = _resample_axis(result, shape[0], img.ndim - 3, work_dtype)
+    if result is img or result.dtype != work_dtype:
+        result = result.astype(work_dtype)
+
+    if src_dtype.kind == 'u':
+        if dtype is None:
+            np.rint(result, out=result)
+            return result.astype(src_dtype)
+
+        result /= np.iinfo(src_dtype).max
+
+    return result
+
+
+def scale_factor(src_shape, dst_shape):
+    """Returns the factor by which lengths in pixels are scaled when resizing
+    an image of the given size to another one, i.e. the geometric mean of the
+    factors of both axes.
+    """
+
+    sy = float(dst_shape[0]) / src_shape[0]
+    sx = float(dst_shape[1]) / src_shape[1]
+    return np.sqrt(sy * sx)
+
+
+def rescale_layers(layers, factor):
+    """Returns layers equivalent to the given ones for an image scaled by the
+    given factor, i.e. with lengths in pixels (such as blur radii) scaled
+    accordingly. Layers which do not depend on the pixel scale are returned
+    as is.
+
+    :param layers: a list of layers.
+    :param factor: ratio of the scaled size to the original one.
+
+    .. seealso:: :meth:`FilterBase._rescaled
+                 <imeffect.base.FilterBase._rescaled>`
+    """
+
+    from .layer import filter_as_layer
+
+    result = []
+    for l in layers:
+        f = getattr(l, 'filter', None)
+        if f is not None:
+            g = f._rescaled(factor)
+            result.append(l if g is f else filter_as_layer(g))
+        elif hasattr(l, '_rescaled'):
+            result.append(l._rescaled(factor))
+        else:
+            result.append(l)
+
+    return tuple(result)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+#################################################
+# tile.py
+# imeffect
+#
+# Copyright (c) 2013-2014, Chi-En Wu
+# Distributed under The BSD 3-Clause License
+#################################################
+
+import threading
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+__all__ = ('window',
+           'current_window',
+           'apply_tiled')
+
+#: Default number of pixels in each strip processed by :func:`apply_tiled`.
+STRIP_PIXELS = 1 << 20
+
+_local = threading.local()
+
+
+@contextmanager
+def window(top, left, height, width):
+    """Tells position-aware filters (such as
+    :class:`Vignette <imeffect.basic.Vignette>`) that the images they process
+    in the current thread are regions of a larger image.
+
+    :param top:
+    :param left: position of the regions in the larger image.
+    :param height:
+    :param width: size of the larger image.
+    """
+
+    previous = getattr(_local, 'window', None)
+    _local.window = (top, left, height, width)
+    try:
+        yield
+    finally:
+        _local.window = previous
+
+
+def current_window(img):
+    """Returns the position and size of the larger image which the given image
+    is a region of, as a (*top*, *left*, *height*, *width*) tuple.
+
+    .. seealso:: :func:`window`
+    """
+
+    current = getattr(_local, 'window', None)
+    if current is None:
+        h, w = img.shape[-3:-1]
+        return (0, 0, h, w)
+
+    return current
+
+
+def apply_tiled(f, img, rows=None, workers=None):
+    """Applies the given filter to the image (in place) strip by strip.
+
+    Each strip is extended by the halo the filter needs (see
+    :func:`halo <imeffect.compiler.halo>`), so that neighbourhood filters
+    see the same pixels as they would on the whole image. Peak memory
+    depends on the strip size instead of the image size.
+
+    Strips can be processed concurrently by a pool of threads, since NumPy
+    and SciPy release the GIL in most kernels. The result is identical to
+    the serial one, except for filters drawing random numbers (such as
+    :class:`Noise <imeffect.basic.Noise>` without a noise texture).
+
+    :param f: a filter.
+    :param img: the image.
+    :param rows: number of rows in each strip.
+    :param workers: number of threads processing strips concurrently.
+    """
+
+    from .compiler import halo
+
+    extra = halo(f)
+    if extra is None:
+        raise ValueError('the filter does not declare its halo')
+
+    h, w = img.shape[:2]
+    if workers and workers > 1:
+        rows = rows or max(1, min(STRIP_PIXELS // w, -(-h // workers)))
+        return _apply_parallel(f, img, rows, extra, workers)
+
+    rows = rows or max(1, STRIP_PIXELS // w)
+
+    # original rows above the current strip, which have been overwritten
+    above = img[:0].copy()
+    for start in xrange(0, h, rows):
+        stop = min(start + rows, h)
+        top = start - len(above)
+        tile = np.concatenate((above, img[start:min(stop + extra, h)]))
+        above = tile[max(0, stop - extra) - top:stop - top].copy()
+
+        with window(top, 0, h, w):
+            tile = f(tile)
+
+        img[start:stop] = tile[start - top:stop - top]
+
+    return img
+
+
+def _apply_parallel(f, img, rows, extra, workers):
+    h, w = img.shape[:2]
+    strips = [(start, min(start + rows, h)) for start in xrange(0, h, rows)]
+
+    # keep the original rows around each strip, since they may be
+    # overwritten by other threads before being read
+    halos = [(img[max(0, start - extra):start].copy(),
+              img[stop:min(stop + extra, h)].copy())
+             for start, stop in strips]
+
+    def process(i):
+        start, stop = strips[i]
+        above, below = halos[i]
+        top = start - len(above)
+        tile = np.concatenate((above, img[start:stop], below))
+        with window(top, 0, h, w):
+            tile = f(tile)
+
+        img[start:stop] = tile[start - top:stop - top]
+
+    pool = ThreadPool(workers)
+    try:
+        pool.map(process, xrange(len(strips)))
+    finally:
+        pool.close()
+        pool.join()
+
+    return img
@@ -9,10 +9,21 @@ Image filter implementations written in Python (with scikit-image).
 
 from setuptools import setup
 from distutils.extension import Extension
-from Cython.Distutils import build_ext
 
 import numpy
 
+# the extension module is optional, imeffect falls back to pure NumPy helpers
+try:
+    from Cython.Distutils import build_ext
+except ImportError:
+    cmdclass = {}
+    ext_modules = []
+else:
+    cmdclass = {'build_ext': build_ext}
+    ext_modules = [
+        Extension('imeffect._util', ['imeffect/_util.pyx'],
+                  include_dirs=[numpy.get_include()])]
+
 setup(
     name='imeffect',
     version='0.1.0',
@@ -26,10 +37,8 @@ setup(
     zip_safe=False,
     platforms='any',
     install_requires=['scikit-image', 'scipy', 'numpy'],
-    cmdclass={'build_ext': build_ext},
-    ext_modules=[
-        Extension('imeffect._util', ['imeffect/_util.pyx'],
-                  include_dirs=[numpy.get_include()])],
+    cmdclass=cmdclass,
+    ext_modules=ext_modules,
     classifiers=[
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',